@@ -1,132 +1,326 @@
 import pandas as pd
-import requests
-from sqlalchemy import create_engine
-from urllib.parse import quote_plus
+from sqlalchemy import text, inspect
 from sqlalchemy.exc import SQLAlchemyError
 import json
-from pathlib import Path
-from datetime import datetime
+import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, date
+from connections import mysql_engine, connect, print_pool_metrics
+from storage import TableWriter, write_table, upsert_table, read_table, table_exists, table_path
+from instrumentation import stage
+from rate_store import load_fixture, refresh_latest, backfill, rates_frame, stored_days
+from config import (BASE_DIR, LAYER_DIRS, MYSQL_CHUNK_SIZE, INCREMENTAL_EXTRACTION, MYSQL_WATERMARK_COLUMNS,
+                    MYSQL_WATERMARK_OVERLAP, MYSQL_PRIMARY_KEYS, EXTRACTION_WORKERS,
+                    RATES_OFFLINE, RATES_FIXTURE, RATES_BACKFILL_START, RATES_BACKFILL_END)
 
 
     # =========================
     # Paths
     # =========================
-BASE_DIR = Path(__file__).resolve().parents[1]
-
 RAW_DIR = BASE_DIR / '1_Extraction'     
 API_DIR = RAW_DIR / 'api_data'
 DB_DIR = RAW_DIR / 'db_data'
 LAKE_DIR = RAW_DIR / 'data_lake'
-CONSOLIDATED_DIR = RAW_DIR / 'consolidated'
-for p in [API_DIR, DB_DIR, LAKE_DIR, CONSOLIDATED_DIR]:
+CONSOLIDATED_DIR = LAYER_DIRS['consolidated']
+STATE_DIR = RAW_DIR / 'state'
+for p in [API_DIR, DB_DIR, LAKE_DIR, CONSOLIDATED_DIR, STATE_DIR]:
     p.mkdir(parents=True, exist_ok=True)
 
 DATA_LAKE_SOURCE = BASE_DIR / 'Datalake Source'
+WATERMARKS_FILE = STATE_DIR / 'watermarks.json'
+CHANGED_ORDERS_FILE = STATE_DIR / 'changed_orders.csv'
+LEGACY_RATES_FILE = API_DIR / 'exchange_rates.json'
+# Sources are extracted concurrently, so read-modify-write of the state files is serialized
+WATERMARKS_LOCK = threading.Lock()
+CHANGES_LOCK = threading.Lock()
 
 # =========================
-# 1) Extract from API
+# Watermarks (incremental extraction state)
 # =========================
-def extract_api(consolidated_dir):
-    App_id = "3da15a39cf8d4527aa5a8f302d6ff936"
-    url = f"https://openexchangerates.org/api/latest.json?app_id={App_id}"
+def load_watermarks():
+    if not WATERMARKS_FILE.exists():
+        return {"mysql": {}, "data_lake": {}}
+    with open(WATERMARKS_FILE, 'r', encoding='utf-8') as f:
+        return json.load(f)
 
-    response = requests.get(url)
-    response.raise_for_status()
-    data = response.json()
-    
-    # Metadata
-    extracted_at = datetime.now().isoformat()
-    data['extracted_at'] = extracted_at
-    data['source'] = 'API'
 
-    # Save raw JSON
-    api_json_file = API_DIR / 'exchange_rates.json'
-    with open(api_json_file, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=2)
+def save_watermark(section, key, value):
+    with WATERMARKS_LOCK:
+        watermarks = load_watermarks()
+        watermarks.setdefault(section, {})[key] = value
+        tmp_file = WATERMARKS_FILE.with_suffix('.json.tmp')
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(watermarks, f, indent=2)
+        tmp_file.replace(WATERMARKS_FILE)
+
+
+def watermark_value(value):
+    # Make numpy / datetime values JSON friendly and comparable with stored ones
+    if hasattr(value, 'item'):
+        value = value.item()
+    if isinstance(value, (datetime, date)):
+        value = value.isoformat()
+    return value
+
+
+def watermark_since(last_watermark, overlap=MYSQL_WATERMARK_OVERLAP):
+    # Lower bound of the next pull: timestamps go back by the overlap window,
+    # numeric watermarks (version counters) are used as they are
+    if not isinstance(last_watermark, str):
+        return last_watermark
+    try:
+        return (pd.Timestamp(last_watermark) - pd.Timedelta(overlap)).to_pydatetime()
+    except ValueError:
+        return last_watermark
+
+
+# =========================
+# Changed orders (what an incremental modeling run has to rebuild)
+# =========================
+def changed_orders():
+    # order_ids extracted since modeling last ran, or None when unknown (a full
+    # pull happened since): incremental modeling then compares the whole fact
+    if not CHANGED_ORDERS_FILE.exists():
+        return None
+    return pd.read_csv(CHANGED_ORDERS_FILE)["order_id"]
+
+
+def record_changed_orders(order_ids):
+    # order_ids a delta touched; None after a full pull, which makes the set unknown
+    with CHANGES_LOCK:
+        if order_ids is None:
+            CHANGED_ORDERS_FILE.unlink(missing_ok=True)
+        elif CHANGED_ORDERS_FILE.exists():
+            order_ids = pd.concat([changed_orders(), pd.Series(order_ids)], ignore_index=True).drop_duplicates()
+            order_ids.to_frame("order_id").to_csv(CHANGED_ORDERS_FILE, index=False)
+
+
+def clear_changed_orders():
+    # Called once modeling loaded the changes: the next extraction starts a new set
+    with CHANGES_LOCK:
+        pd.DataFrame({"order_id": []}).to_csv(CHANGED_ORDERS_FILE, index=False)
+
+
+def file_fingerprint(file):
+    sha256 = hashlib.sha256()
+    with open(file, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+# =========================
+# 1) Extract from API
+# =========================
+def extract_api():
+    # Rates come from the local rate store (see rate_store); the API is only
+    # called when the latest rates are past their TTL or days are missing
+    offline = RATES_OFFLINE or bool(RATES_FIXTURE)
+    if RATES_FIXTURE:
+        print(f'Exchange rates fixture: {load_fixture(RATES_FIXTURE)} file(s) added to the rate store')
+    elif not stored_days() and LEGACY_RATES_FILE.exists():
+        # Seed the store with the response saved by earlier versions
+        load_fixture(LEGACY_RATES_FILE)
+
+    status = refresh_latest(offline=offline)
+    backfilled = 0
+    if RATES_BACKFILL_START:
+        backfilled = backfill(RATES_BACKFILL_START, RATES_BACKFILL_END or date.today(), offline=offline)
 
     # Transform to DataFrame & consolidate
-    rates_df = pd.DataFrame(list(data['rates'].items()), columns=['currency', 'rate'])
-    rates_df['extracted_at'] = extracted_at
+    rates_df = rates_frame()
+    if rates_df.empty:
+        raise RuntimeError('No exchange rates: the rate store is empty and the API was not called')
+    rates_df['extracted_at'] = datetime.now().isoformat()
     rates_df['source'] = 'API'
 
-    csv_file = consolidated_dir / 'exchange_rates.csv'
-    rates_df.to_csv(csv_file, index=False)
-    print('API data extracted and consolidated ->', csv_file)
+    out_file = write_table(rates_df, 'consolidated', 'exchange_rates')
+    print(f'API data ({status}, {backfilled} day(s) backfilled, {rates_df["date"].nunique()} day(s) stored) consolidated ->', out_file)
+    return {"table": "exchange_rates", "rows": len(rates_df)}
 
 # =========================
 # 2) Extract from Database
 # =========================
-def extract_mysql_table(table_name):
+def extract_mysql_table(table_name, chunk_size=MYSQL_CHUNK_SIZE, incremental=INCREMENTAL_EXTRACTION):
+    stats = {"table": table_name, "mode": "full", "rows": 0, "bytes": 0, "chunks": []}
     try:
-        DB_USER = "root"
-        DB_PASS = quote_plus("Asd@123456789")  # <-- encode
-        DB_HOST = "localhost"
-        DB_PORT = 3306
-        DB_NAME = "pyproject_orders"
+        # Shared pooled engine, credentials come from config / ETL_MYSQL_* env vars
+        engine = mysql_engine()
+
+        extracted_at = datetime.now().isoformat()
+
+        # 1) Full pull, or only the rows modified since the last watermark (minus the overlap)
+        watermark_col = MYSQL_WATERMARK_COLUMNS.get(table_name)
+        with connect(engine) as conn:
+            if watermark_col and watermark_col not in {c["name"] for c in inspect(conn).get_columns(table_name)}:
+                print(f"⚠️ '{table_name}' has no '{watermark_col}' column, extracted in full")
+                watermark_col = None
+        last_watermark = None
+        if incremental and watermark_col and table_exists("consolidated", table_name):
+            last_watermark = load_watermarks()["mysql"].get(f"{table_name}.{watermark_col}")
 
-        engine = create_engine(
-            f"mysql+pymysql://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
-        )
+        if last_watermark is None:
+            query = text(f"SELECT * FROM {table_name}")
+            params = {}
+        else:
+            query = text(f"SELECT * FROM {table_name} WHERE {watermark_col} >= :since ORDER BY {watermark_col}")
+            params = {"since": watermark_since(last_watermark)}
+            stats["mode"] = "incremental"
+        new_watermark = last_watermark
 
-        # 2) Read data
-        query = f"SELECT * FROM {table_name}"
-        df = pd.read_sql(query, engine)
+        # 2) Stream data with a server-side cursor, chunk_size rows at a time.
+        #    A delta goes to <table>_delta first and is upserted once fully read
+        target = table_name if stats["mode"] == "full" else f"{table_name}_delta"
+        with connect(engine) as conn, TableWriter("consolidated", target) as writer:
+            conn = conn.execution_options(stream_results=True, max_row_buffer=chunk_size)
+            for chunk in pd.read_sql(query, conn, params=params, chunksize=chunk_size):
+                # 3) Add metadata
+                chunk["extracted_at"] = extracted_at
+                chunk["source"] = "MYSQL"
 
-        # 3) Add metadata
-        df["extracted_at"] = datetime.now().isoformat()
-        df["source"] = "MYSQL"
+                if watermark_col and not chunk.empty:
+                    chunk_max = watermark_value(chunk[watermark_col].max())
+                    new_watermark = chunk_max if new_watermark is None else max(new_watermark, chunk_max)
 
-        # 4) Save to CSV
-        csv_file = CONSOLIDATED_DIR / f"{table_name}.csv"
-        df.to_csv(csv_file, index=False)
+                # 4) Append chunk to the consolidated output
+                chunk_bytes = writer.write(chunk)
 
-        print(f"Table '{table_name}' extracted -> {csv_file}")
+                stats["chunks"].append({"rows": len(chunk), "bytes": chunk_bytes})
+                stats["rows"] += len(chunk)
+                stats["bytes"] += chunk_bytes
+                print(f"  chunk {len(stats['chunks'])}: {len(chunk)} rows, {chunk_bytes} bytes")
+
+        # 5) Changed rows replace the consolidated ones by primary key
+        out_file = writer.path
+        tracks_orders = "order_id" in MYSQL_PRIMARY_KEYS[table_name]
+        if stats["mode"] == "incremental" and stats["rows"]:
+            delta = read_table("consolidated", target)
+            out_file, total_rows = upsert_table(delta, "consolidated", table_name, MYSQL_PRIMARY_KEYS[table_name], chunk_size)
+            print(f"  {stats['rows']} changed row(s) upserted, {total_rows} rows in '{table_name}'")
+            if tracks_orders:
+                record_changed_orders(delta["order_id"])
+        if stats["mode"] == "incremental":
+            table_path("consolidated", target).unlink(missing_ok=True)
+        elif stats["mode"] == "full" and tracks_orders:
+            record_changed_orders(None)
+
+        if watermark_col and new_watermark is not None:
+            save_watermark("mysql", f"{table_name}.{watermark_col}", new_watermark)
+
+        print(f"Table '{table_name}' extracted ({stats['mode']}) -> {out_file} ({stats['rows']} rows, {stats['bytes']} bytes)")
 
     except SQLAlchemyError as err:
         print(f"❌ MySQL Error for table '{table_name}': {err}")
+        stats["error"] = str(err)
 
     except Exception as err:
         print(f"❌ General Error for table '{table_name}': {err}")
+        stats["error"] = str(err)
+
+    return stats
 
 # =========================
 # 3) Extract from Data Lake
 # =========================
-def extract_data_lake():
+def extract_data_lake_file(file, known_files, incremental=INCREMENTAL_EXTRACTION):
+    table_name = file.stem
+    file_stat = file.stat()
+    previous = known_files.get(file.name)
+
+    # Cheap mtime/size check first, only hash files that look touched
+    if incremental and previous and table_exists('consolidated', table_name):
+        if previous["mtime"] == file_stat.st_mtime and previous["size"] == file_stat.st_size:
+            print(f'Data Lake file {file.name} unchanged, skipped')
+            return
+        content_hash = file_fingerprint(file)
+        if previous["sha256"] == content_hash:
+            save_watermark("data_lake", file.name, {"mtime": file_stat.st_mtime, "size": file_stat.st_size, "sha256": content_hash})
+            print(f'Data Lake file {file.name} unchanged (touched only), skipped')
+            return
+    else:
+        content_hash = file_fingerprint(file)
+
+    df = pd.read_csv(file)
+    df['extracted_at'] = datetime.now().isoformat()
+    df['source'] = 'DataLake'
+
+    out_file = write_table(df, 'consolidated', table_name)
+    save_watermark("data_lake", file.name, {"mtime": file_stat.st_mtime, "size": file_stat.st_size, "sha256": content_hash})
+    print(f'Data Lake file {file.name} extracted and consolidated -> {out_file}')
+    return {"table": table_name, "rows": len(df)}
+
+
+def extract_data_lake(incremental=INCREMENTAL_EXTRACTION):
     if not DATA_LAKE_SOURCE.exists():
         print('No external data lake folder, skipping Data Lake extraction')
         return
 
+    known_files = load_watermarks()["data_lake"]
     for file in DATA_LAKE_SOURCE.glob('*.csv'):
-        df = pd.read_csv(file)
-        df['extracted_at'] = datetime.now().isoformat()
-        df['source'] = 'DataLake'
+        extract_data_lake_file(file, known_files, incremental)
+
+# =========================
+# 4) Concurrent scheduler
+# =========================
+def extraction_tasks():
+    tasks = {"api:exchange_rates": extract_api}
+
+    for table in ["orders", "order_items"]:
+        tasks[f"mysql:{table}"] = lambda table=table: extract_mysql_table(table)
+
+    if DATA_LAKE_SOURCE.exists():
+        known_files = load_watermarks()["data_lake"]
+        for file in DATA_LAKE_SOURCE.glob('*.csv'):
+            tasks[f"datalake:{file.name}"] = lambda file=file: extract_data_lake_file(file, known_files)
+    else:
+        print('No external data lake folder, skipping Data Lake extraction')
+
+    return tasks
+
+
+def run_timed(name, task):
+    start = time.perf_counter()
+    try:
+        with stage("extract", name) as record:
+            result = task()
+            if isinstance(result, dict):
+                record["rows_out"] = result.get("rows")
+        status = "failed" if isinstance(result, dict) and "error" in result else "ok"
+    except Exception as err:
+        # One failing source must not abort the others
+        print(f"❌ Extraction failed for '{name}': {err}")
+        status = "failed"
+    return {"source": name, "status": status, "seconds": time.perf_counter() - start}
 
-        out_file = CONSOLIDATED_DIR / file.name
-        df.to_csv(out_file, index=False)
-        print(f'Data Lake file {file.name} extracted and consolidated -> {out_file}')
+
+def run_extraction_tasks(tasks, workers=EXTRACTION_WORKERS):
+    results = []
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = [executor.submit(run_timed, name, task) for name, task in tasks.items()]
+        for future in as_completed(futures):
+            results.append(future.result())
+    return sorted(results, key=lambda r: r["seconds"], reverse=True)
 
     # =========================
     # Main
     # =========================
-def run_extraction():
+def run_extraction(workers=EXTRACTION_WORKERS):
     print("🔹Extraction started")    
     
     print('--- EXTRACT + CONSOLIDATION PHASE STARTED ---')
+    start = time.perf_counter()
 
-    # 1) API
-    try:
-        extract_api(CONSOLIDATED_DIR)
-        
-    except Exception as e:
-        print('API extraction failed:', e)
+    # API, MySQL tables and Data Lake files are independent and I/O bound
+    results = run_extraction_tasks(extraction_tasks(), workers)
 
-    # 2) MySQL
-    for table in ["orders", "order_items"]:
-        extract_mysql_table(table)
-        
-    # 3) Data Lake
-    extract_data_lake()
+    print(f"--- Extraction timings ({workers} workers) ---")
+    for r in results:
+        print(f"  {r['source']:<30} {r['status']:<7} {r['seconds']:.2f}s")
+    print(f"  {'total wall time':<30} {'':<7} {time.perf_counter() - start:.2f}s")
+    print_pool_metrics()
     print("✅ Extraction and Consolidation Completed Successfully")
+    return results
     
 if __name__ == '__main__':
     run_extraction()
\ No newline at end of file
@@ -0,0 +1,301 @@
+import os
+import sys
+import json
+import shutil
+import argparse
+import subprocess
+import time
+from datetime import datetime
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine
+from cleaning_transformations import add_delivery_metrics, add_local_flag
+from synthetic_data import write_dataset
+from config import BASE_DIR
+
+
+# =========================
+# Synthetic data
+# =========================
+def synthetic_orders(n_orders, seed=0):
+    rng = np.random.default_rng(seed)
+    order_date = pd.Timestamp("2016-01-01") + pd.to_timedelta(rng.integers(0, 3 * 365, n_orders), unit="D")
+    shipped_date = pd.Series(order_date + pd.to_timedelta(rng.integers(0, 8, n_orders), unit="D"))
+    shipped_date[rng.random(n_orders) < 0.05] = pd.NaT   # not shipped yet
+    return pd.DataFrame({
+        "order_id": np.arange(1, n_orders + 1),
+        "order_status": rng.integers(1, 6, n_orders),
+        "order_date": order_date,
+        "required_date": order_date + pd.to_timedelta(rng.integers(2, 6, n_orders), unit="D"),
+        "shipped_date": shipped_date,
+    })
+
+
+def synthetic_customers(n_customers, n_cities=500, seed=0):
+    rng = np.random.default_rng(seed)
+    cities = np.array([f"City {i}" for i in range(n_cities)])
+    return pd.DataFrame({
+        "customer_id": np.arange(1, n_customers + 1),
+        "city": cities[rng.integers(0, n_cities, n_customers)],
+    })
+
+
+def synthetic_stores():
+    return pd.DataFrame({"store_id": [1, 2, 3], "city": ["City 0", "City 1", "City 2"]})
+
+
+# =========================
+# Row-wise reference (the previous implementation)
+# =========================
+def rowwise_delivery_metrics(orders):
+    orders = orders.copy()
+    orders["delivery_time_days"] = (pd.to_datetime(orders["shipped_date"]) - pd.to_datetime(orders["order_date"])).dt.days
+    orders["late_delivery_days"] = (pd.to_datetime(orders["shipped_date"]) - pd.to_datetime(orders["required_date"])).dt.days
+    orders["late_delivery_days"] = orders["late_delivery_days"].apply(lambda x: x if x > 0 else 0)
+    orders["late_flag"] = orders["late_delivery_days"].apply(lambda x: "Late" if x > 0 else "On Time")
+    return orders
+
+
+def rowwise_local_flag(customers, stores):
+    customers = customers.copy()
+    customers["local_flag"] = customers["city"].apply(lambda x: "Local" if x in stores["city"].values else "Non-Local")
+    return customers
+
+
+# =========================
+# Runner
+# =========================
+def timed(func, *args):
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def run_transform_benchmark(n_orders, n_customers, steps, rowwise_max):
+    stores = synthetic_stores()
+    print(f"{'transform':<18} {'rows':>12} {'vectorized':>12} {'row-wise':>12} {'rows/s':>14}")
+    for fraction in np.geomspace(1 / 10 ** (steps - 1), 1, steps):
+        orders = synthetic_orders(int(n_orders * fraction))
+        customers = synthetic_customers(int(n_customers * fraction))
+        cases = [
+            ("delivery_metrics", orders, lambda: add_delivery_metrics(orders), lambda: rowwise_delivery_metrics(orders)),
+            ("local_flag", customers, lambda: add_local_flag(customers, stores), lambda: rowwise_local_flag(customers, stores)),
+        ]
+        for name, df, vectorized, rowwise in cases:
+            vectorized_seconds = timed(vectorized)
+            rowwise_seconds = f"{timed(rowwise):.3f}s" if len(df) <= rowwise_max else "skipped"
+            print(f"{name:<18} {len(df):>12,} {vectorized_seconds:>11.3f}s {rowwise_seconds:>12} {len(df) / vectorized_seconds:>14,.0f}")
+
+
+# =========================
+# Pipeline benchmark (synthetic data per scale factor)
+# =========================
+# Every scale runs main.py --metrics in its own process on a synthetic dataset
+# (SQLite stands in for MySQL and the warehouse, rates come from a fixture).
+# Stage groups are summed from the run report (see instrumentation); stages of
+# a group that ran in parallel threads add up, so rows/s is per worker.
+CODE_DIR = Path(__file__).resolve().parent
+BENCH_DIR = BASE_DIR / "benchmarks"
+STAGE_GROUPS = {
+    "extraction": [("extract", None)],
+    "cleaning": [("clean", None)],
+    "transform": [("transform", None)],
+    "build_fact_sales": [("build", "fact_sales")],
+    "loading": [("load", None)],
+    "reporting": [("query", None), ("chart", None)],
+}
+# Outputs of an earlier run, removed before each run
+DERIVED = [".etl_cache", "1_Extraction", "2_Staging", "3_Modeling", "Reports & Visualization", "run_reports", "dwh.db"]
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=CODE_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run_scale(out_dir, engine="pandas"):
+    for name in DERIVED:
+        path = out_dir / name
+        if path.is_dir():
+            shutil.rmtree(path)
+        elif path.exists():
+            path.unlink()
+    env = dict(
+        os.environ,
+        ETL_BASE_DIR=str(out_dir),
+        ETL_MYSQL_URL=f"sqlite:///{(out_dir / 'source.db').as_posix()}",
+        ETL_DWH_URL=f"sqlite:///{(out_dir / 'dwh.db').as_posix()}",
+        ETL_RATES_FIXTURE=str(out_dir / "exchange_rates.json"),
+        ETL_INCREMENTAL="0",
+        ETL_RUN_ID="benchmark",
+        ETL_ENGINE=engine,
+        MPLBACKEND="Agg",
+    )
+    with open(out_dir / "pipeline.log", "w", encoding="utf-8") as log:
+        subprocess.run([sys.executable, "main.py", "--metrics"], cwd=CODE_DIR, env=env, stdout=log,
+                       stderr=subprocess.STDOUT, check=True)
+    with open(out_dir / "run_reports" / "run_benchmark.json", "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def summarize(report, scale, groups=STAGE_GROUPS):
+    rows = []
+    for group, matches in groups.items():
+        stages = [s for s in report["stages"]
+                  if any(s["kind"] == kind and (name is None or s["name"] == name) for kind, name in matches)]
+        seconds = sum(s["wall_s"] for s in stages)
+        count = sum(s["rows_out"] or 0 for s in stages)
+        rows.append({
+            "scale": scale, "stage": group, "rows": count, "seconds": round(seconds, 4),
+            "rows_per_s": round(count / seconds) if seconds else None,
+            "peak_rss_mb": max((s["peak_rss_mb"] or 0 for s in stages), default=None),
+        })
+    rows.append({"scale": scale, "stage": "total", "rows": None, "seconds": report["wall_s"],
+                 "rows_per_s": None, "peak_rss_mb": report["peak_rss_mb"]})
+    return rows
+
+
+def run_pipeline_benchmark(scales, work_dir, seed=0):
+    results = []
+    for scale in scales:
+        out_dir = Path(work_dir) / f"scale_{scale:g}"
+        start = time.perf_counter()
+        counts = write_dataset(scale, out_dir, seed)
+        print(f"🔹 Scale {scale:g}x: {counts['orders']:,} orders, {counts['order_items']:,} order items "
+              f"(data ready in {time.perf_counter() - start:.1f}s)")
+        results.extend(summarize(run_scale(out_dir), scale))
+
+    print(f"{'scale':>8} {'stage':<18} {'rows':>12} {'seconds':>10} {'rows/s':>12} {'peak MB':>9}")
+    for r in results:
+        rows = "" if r["rows"] is None else f"{r['rows']:,}"
+        rate = "" if r["rows_per_s"] is None else f"{r['rows_per_s']:,}"
+        print(f"{r['scale']:>7g}x {r['stage']:<18} {rows:>12} {r['seconds']:>9.3f}s {rate:>12} {r['peak_rss_mb'] or 0:>9.1f}")
+
+    BENCH_DIR.mkdir(parents=True, exist_ok=True)
+    commit = git_commit()
+    out_file = BENCH_DIR / f"pipeline_{commit}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(out_file, "w", encoding="utf-8") as f:
+        json.dump({"commit": commit, "seed": seed, "results": results}, f, indent=2)
+    print(f"✅ Benchmark results -> {out_file}")
+    return out_file
+
+
+def compare_results(old_file, new_file):
+    # Rows/s (seconds for the total) of two result files, per scale and stage
+    with open(old_file, "r", encoding="utf-8") as f:
+        old = json.load(f)
+    with open(new_file, "r", encoding="utf-8") as f:
+        new = json.load(f)
+    before = {(r["scale"], r["stage"]): r for r in old["results"]}
+    print(f"{'scale':>8} {'stage':<18} {old['commit']:>12} {new['commit']:>12} {'change':>8}")
+    for r in new["results"]:
+        previous = before.get((r["scale"], r["stage"]))
+        if previous is None:
+            continue
+        metric = "seconds" if r["rows_per_s"] is None or previous["rows_per_s"] is None else "rows_per_s"
+        if not previous[metric]:
+            continue
+        change = r[metric] / previous[metric] - 1
+        # Higher rows/s is better, lower seconds is better
+        worse = change < 0 if metric == "rows_per_s" else change > 0
+        flag = " ⚠️" if worse and abs(change) > 0.1 else ""
+        print(f"{r['scale']:>7g}x {r['stage']:<18} {previous[metric]:>12,} {r[metric]:>12,} {change:>+8.1%}{flag}")
+
+
+# =========================
+# Engine benchmark (pandas vs DuckDB on the same synthetic data)
+# =========================
+# Both engines run the whole pipeline per scale; the warehouse tables they
+# load must be identical, and the stages the engine runs are timed side by
+# side. A speedup below 1 means pandas is faster on this host: keep the
+# default engine. Parity on its own is tested in tests/test_engines.py.
+ENGINE_TABLES = ["dim_date", "dim_region", "dim_product", "dim_customer", "dim_store", "dim_staff", "fact_sales"]
+ENGINE_GROUPS = {
+    "cleaning": [("clean", None)],
+    "build_dimensions": [("build", name) for name in ENGINE_TABLES if name != "fact_sales"],
+    "build_fact_sales": [("build", "fact_sales")],
+}
+
+
+def warehouse_tables(out_dir):
+    engine = create_engine(f"sqlite:///{(out_dir / 'dwh.db').as_posix()}")
+    try:
+        return {name: pd.read_sql_table(name, engine) for name in ENGINE_TABLES}
+    finally:
+        engine.dispose()
+
+
+def check_parity(expected, actual):
+    # Names of the tables that differ between the two engines
+    different = []
+    for name in ENGINE_TABLES:
+        try:
+            pd.testing.assert_frame_equal(expected[name], actual[name])
+        except AssertionError as err:
+            print(f"❌ {name} differs between the engines: {str(err).splitlines()[0]}")
+            different.append(name)
+    return different
+
+
+def run_engine_benchmark(scales, work_dir, seed=0):
+    results, failed = [], []
+    for scale in scales:
+        out_dir = Path(work_dir) / f"scale_{scale:g}"
+        counts = write_dataset(scale, out_dir, seed)
+        print(f"🔹 Scale {scale:g}x: {counts['orders']:,} orders, {counts['order_items']:,} order items")
+        baseline = summarize(run_scale(out_dir, "pandas"), scale, ENGINE_GROUPS)
+        expected = warehouse_tables(out_dir)
+        duckdb_rows = summarize(run_scale(out_dir, "duckdb"), scale, ENGINE_GROUPS)
+        failed += [f"{scale:g}x {name}" for name in check_parity(expected, warehouse_tables(out_dir))]
+        for pandas_row, duckdb_row in zip(baseline, duckdb_rows):
+            results.append({
+                "scale": scale, "stage": pandas_row["stage"], "rows": duckdb_row["rows"],
+                "pandas_s": pandas_row["seconds"], "duckdb_s": duckdb_row["seconds"],
+                "speedup": round(pandas_row["seconds"] / duckdb_row["seconds"], 2) if duckdb_row["seconds"] else None,
+            })
+
+    print(f"{'scale':>8} {'stage':<18} {'rows':>12} {'pandas':>10} {'duckdb':>10} {'speedup':>8}")
+    for r in results:
+        rows = "" if r["rows"] is None else f"{r['rows']:,}"
+        speedup = "" if r["speedup"] is None else f"{r['speedup']:.2f}x"
+        print(f"{r['scale']:>7g}x {r['stage']:<18} {rows:>12} {r['pandas_s']:>9.3f}s {r['duckdb_s']:>9.3f}s {speedup:>8}")
+
+    BENCH_DIR.mkdir(parents=True, exist_ok=True)
+    commit = git_commit()
+    out_file = BENCH_DIR / f"engines_{commit}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(out_file, "w", encoding="utf-8") as f:
+        json.dump({"commit": commit, "seed": seed, "parity_failures": failed, "results": results}, f, indent=2)
+    print(f"✅ Benchmark results -> {out_file}")
+    if failed:
+        raise SystemExit(f"❌ Engine outputs differ: {', '.join(failed)}")
+    print("✅ Both engines loaded identical warehouse tables")
+    slower = sorted({f"{r['scale']:g}x" for r in results if r["stage"] == "total" and r["speedup"] and r["speedup"] < 1})
+    if slower:
+        print(f"⚠️ DuckDB is slower than pandas on this host at {', '.join(slower)}: keep ETL_ENGINE=pandas there")
+    return out_file
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scaling benchmarks: the transformation stage, or the whole pipeline on synthetic data")
+    parser.add_argument("--suite", choices=["transforms", "pipeline", "engines"], default="transforms")
+    parser.add_argument("--orders", type=int, default=10_000_000)
+    parser.add_argument("--customers", type=int, default=1_000_000)
+    parser.add_argument("--steps", type=int, default=3, help="sizes from 1/10^(steps-1) of the target up to the target")
+    parser.add_argument("--rowwise-max", type=int, default=1_000_000, help="largest input the row-wise reference is run on")
+    parser.add_argument("--scales", type=float, nargs="+", default=[1, 100], help="pipeline / engines suites: scale factors of the sample data, e.g. 1 100 10000")
+    parser.add_argument("--work-dir", type=Path, default=BENCH_DIR / "data", help="pipeline / engines suites: where the synthetic datasets are kept")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--compare", nargs=2, type=Path, metavar=("OLD", "NEW"), help="compare two pipeline result files and exit")
+    args = parser.parse_args()
+    if args.compare:
+        compare_results(*args.compare)
+    elif args.suite == "pipeline":
+        run_pipeline_benchmark(args.scales, args.work_dir, args.seed)
+    elif args.suite == "engines":
+        run_engine_benchmark(args.scales, args.work_dir, args.seed)
+    else:
+        run_transform_benchmark(args.orders, args.customers, args.steps, args.rowwise_max)
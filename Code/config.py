@@ -0,0 +1,263 @@
+import os
+from pathlib import Path
+from urllib.parse import quote_plus
+
+
+# =========================
+# Paths & storage
+# =========================
+BASE_DIR = Path(os.getenv("ETL_BASE_DIR", Path(__file__).resolve().parents[1]))
+
+LAYER_DIRS = {
+    "consolidated": BASE_DIR / "1_Extraction" / "consolidated",
+    "staging_1": BASE_DIR / "2_Staging" / "staging_1",
+    "staging_2": BASE_DIR / "2_Staging" / "staging_2",
+    "data_warehouse": BASE_DIR / "3_Modeling" / "data_warehouse",
+    "quarantine": BASE_DIR / "2_Staging" / "quarantine",
+    "warehouse_arrow": BASE_DIR / "3_Modeling" / "warehouse_arrow",
+}
+
+# File format per layer: csv (default, backwards compatible), parquet or arrow.
+# ETL_FORMAT sets every layer, ETL_FORMAT_<LAYER> overrides a single one.
+STORAGE_FORMATS = {
+    layer: os.getenv(f"ETL_FORMAT_{layer.upper()}", os.getenv("ETL_FORMAT", "csv"))
+    for layer in LAYER_DIRS
+}
+PARQUET_COMPRESSION = os.getenv("ETL_PARQUET_COMPRESSION", "snappy")
+
+# Uncompressed Arrow IPC copy of every data_warehouse table, whatever the
+# layer's format: reports and notebooks memory-map it (storage.read_mapped).
+# ETL_WAREHOUSE_ARROW=0 turns the copy off
+WAREHOUSE_ARROW = os.getenv("ETL_WAREHOUSE_ARROW", "1") == "1"
+STORAGE_FORMATS["warehouse_arrow"] = "arrow"
+
+
+# =========================
+# Extraction
+# =========================
+# Rows fetched per round-trip when streaming MySQL tables with a server-side cursor
+MYSQL_CHUNK_SIZE = int(os.getenv("ETL_MYSQL_CHUNK_SIZE", "50000"))
+
+# Incremental extraction: only pull rows past the persisted watermark and skip
+# unchanged data-lake files. Set ETL_INCREMENTAL=0 to force a full refresh.
+INCREMENTAL_EXTRACTION = os.getenv("ETL_INCREMENTAL", "1") == "1"
+
+# Column tracked as the watermark for each MySQL table: a last-modified
+# timestamp, so updated rows come back too, not only new ones. Each pull reads
+# watermark - overlap onwards (>=), which also catches rows committed late for
+# a time already extracted; rows read twice are harmless because the delta is
+# upserted by primary key (last write wins). A table without the column is
+# extracted in full
+MYSQL_WATERMARK_COLUMNS = {
+    "orders": os.getenv("ETL_ORDERS_WATERMARK", "updated_at"),
+    "order_items": os.getenv("ETL_ORDER_ITEMS_WATERMARK", "updated_at"),
+}
+MYSQL_WATERMARK_OVERLAP = os.getenv("ETL_WATERMARK_OVERLAP", "1h")
+MYSQL_PRIMARY_KEYS = {
+    "orders": ["order_id"],
+    "order_items": ["order_id", "item_id"],
+}
+
+# Worker threads used to extract API, MySQL tables and data-lake files concurrently
+EXTRACTION_WORKERS = int(os.getenv("ETL_EXTRACTION_WORKERS", "4"))
+
+# Exchange rates (openexchangerates.org, USD based) are kept in a local store,
+# one API response per day. The latest rates are re-fetched (conditionally, by
+# ETag) once older than RATES_TTL_HOURS; historical days never change and are
+# fetched once. Offline, or with a fixture (an API response JSON file or a
+# folder of them), no API call is made.
+# The app id is a secret: it has no default, see rate_store.fetch
+OXR_APP_ID = os.getenv("ETL_OXR_APP_ID")
+RATES_DIR = BASE_DIR / "1_Extraction" / "api_data" / "rates"
+RATES_TTL_HOURS = float(os.getenv("ETL_RATES_TTL_HOURS", "24"))
+RATES_TIMEOUT = float(os.getenv("ETL_RATES_TIMEOUT", "30"))
+RATES_OFFLINE = os.getenv("ETL_RATES_OFFLINE", "0") == "1"
+RATES_FIXTURE = os.getenv("ETL_RATES_FIXTURE")
+# Optional backfill of historical rates, e.g. 2016-01-01 .. 2018-12-31, one day
+# per RATES_BACKFILL_FREQ (pandas frequency, "MS" = first day of every month)
+RATES_BACKFILL_START = os.getenv("ETL_RATES_BACKFILL_START")
+RATES_BACKFILL_END = os.getenv("ETL_RATES_BACKFILL_END")
+RATES_BACKFILL_FREQ = os.getenv("ETL_RATES_BACKFILL_FREQ", "MS")
+
+# =========================
+# Database connections
+# =========================
+# Full SQLAlchemy URLs win; otherwise a URL is built from its parts. Passwords
+# have no defaults: without ETL_*_URL or ETL_*_PASSWORD the URL is None and
+# connecting fails with the variables to set (connections.configured_url)
+def database_url(prefix, template, user, port, db):
+    url = os.getenv(f"ETL_{prefix}_URL")
+    password = os.getenv(f"ETL_{prefix}_PASSWORD")
+    if url or password is None:
+        return url
+    return template.format(
+        user=os.getenv(f"ETL_{prefix}_USER", user),
+        password=quote_plus(password),  # <-- encode
+        host=os.getenv(f"ETL_{prefix}_HOST", "localhost"),
+        port=os.getenv(f"ETL_{prefix}_PORT", port),
+        db=os.getenv(f"ETL_{prefix}_DB", db),
+    )
+
+
+MYSQL_URL = database_url("MYSQL", "mysql+pymysql://{user}:{password}@{host}:{port}/{db}", "root", "3306", "pyproject_orders")
+DWH_URL = database_url("DWH", "postgresql+psycopg://{user}:{password}@{host}:{port}/{db}", "postgres", "5432", "PyProject_DWH")
+
+# One pool per DSN is shared by the whole process
+DB_POOL_SIZE = int(os.getenv("ETL_DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("ETL_DB_MAX_OVERFLOW", "10"))
+DB_POOL_RECYCLE = int(os.getenv("ETL_DB_POOL_RECYCLE", "1800"))
+
+# =========================
+# Stage hand-off
+# =========================
+# Stages pass DataFrames to each other in memory; writing every layer to disk
+# happens in background threads and can be switched off with ETL_PERSIST_STAGES=0
+PERSIST_STAGE_OUTPUTS = os.getenv("ETL_PERSIST_STAGES", "1") == "1"
+PERSIST_WORKERS = int(os.getenv("ETL_PERSIST_WORKERS", "2"))
+
+# =========================
+# Warehouse loading
+# =========================
+# Rows per COPY block (Postgres) or executemany batch (other databases)
+LOAD_BATCH_SIZE = int(os.getenv("ETL_LOAD_BATCH_SIZE", "100000"))
+
+# =========================
+# Modeling
+# =========================
+# full: rebuild every warehouse table; incremental: merge dimensions by natural
+# key (SCD type 1) and only insert / update new or changed fact_sales lines
+MODELING_MODE = os.getenv("ETL_MODELING_MODE", "full")
+
+# dim_date is a calendar (one row per day) covering every order date; it is kept
+# in the data_warehouse layer and only extended. Optional fixed span, YYYY-MM-DD
+DIM_DATE_START = os.getenv("ETL_DIM_DATE_START")
+DIM_DATE_END = os.getenv("ETL_DIM_DATE_END")
+
+# Partition fact_sales by order date (year / month): Hive-style directories in
+# the data_warehouse layer and declarative range partitions in Postgres. An
+# incremental run only reads and rewrites the partitions its orders touch
+PARTITION_FACT_SALES = os.getenv("ETL_PARTITION_FACT_SALES", "0") == "1"
+# Rows a streamed partitioned write buffers per partition before appending them
+# to the partition's single file
+PARTITION_FLUSH_ROWS = int(os.getenv("ETL_PARTITION_FLUSH_ROWS", "100000"))
+
+# Out-of-core fact_sales (full mode): orders and order lines are streamed in
+# chunks, hash-partitioned by order_id into spill files, and fact rows are built
+# and loaded one bucket at a time, so memory follows dimension / bucket size
+FACT_SALES_OUT_OF_CORE = os.getenv("ETL_FACT_OUT_OF_CORE", "0") == "1"
+FACT_SALES_CHUNK_SIZE = int(os.getenv("ETL_FACT_CHUNK_SIZE", "100000"))
+FACT_SALES_BUCKETS = int(os.getenv("ETL_FACT_BUCKETS", "32"))
+# Where spill files go (default: the system temp directory)
+SPILL_DIR = os.getenv("ETL_SPILL_DIR") or None
+
+# =========================
+# Data quality rules
+# =========================
+# Checks per consolidated table, compiled into one boolean mask (see quality_rules).
+# A row is rejected by the first failing rule, in this order:
+#   not_null            - essential columns must be present
+#   unique              - keep the first row per key (among rows passing not_null)
+#   positive            - numeric columns must be > 0
+#   dates_not_in_future - parsed as dates, missing / unparseable / future dates fail
+CLEANING_RULES = {
+    "orders": {
+        "not_null": ["order_id", "customer_id", "order_date", "required_date"],
+        "unique": ["order_id"],
+        "dates_not_in_future": ["order_date", "required_date", "shipped_date", "Extraction_Date", "extracted_at"],
+    },
+    "order_items": {
+        "not_null": ["item_id", "order_id", "product_id", "quantity", "list_price"],
+        "unique": ["item_id", "order_id", "product_id", "quantity", "list_price"],
+        "positive": ["list_price"],
+        "dates_not_in_future": ["Extraction_Date", "extracted_at"],
+    },
+    "brands": {
+        "not_null": ["brand_id", "brand_name"],
+        "unique": ["brand_id"],
+        "dates_not_in_future": ["extracted_at"],
+    },
+    "categories": {
+        "not_null": ["category_id", "category_name"],
+        "unique": ["category_id"],
+        "dates_not_in_future": ["extracted_at"],
+    },
+    "customers": {
+        "unique": ["customer_id"],
+        "dates_not_in_future": ["extracted_at"],
+    },
+    "products": {
+        "not_null": ["product_id", "product_name", "list_price"],
+        "unique": ["product_id"],
+        "positive": ["list_price"],
+        "dates_not_in_future": ["extracted_at"],
+    },
+    "staffs": {
+        "unique": ["staff_id"],
+        "dates_not_in_future": ["extracted_at"],
+    },
+    "stores": {
+        "dates_not_in_future": ["extracted_at"],
+    },
+    "stocks": {
+        "positive": ["quantity"],
+        "dates_not_in_future": ["extracted_at"],
+    },
+    "exchange_rates": {
+        "positive": ["rate"],
+        "dates_not_in_future": ["extracted_at"],
+    },
+}
+
+# Write rejected rows (with the rule that rejected them) to 2_Staging/quarantine
+QUARANTINE_REJECTS = os.getenv("ETL_QUARANTINE", "0") == "1"
+
+# Worker processes the pipeline DAG cleans tables in (1 = in the DAG threads, no processes)
+CLEANING_WORKERS = int(os.getenv("ETL_CLEANING_WORKERS", str(os.cpu_count() or 1)))
+
+# Currencies order item prices are converted to (rates as of the order date).
+# The first one fills list_price_local, the others list_price_<currency>
+TARGET_CURRENCIES = [c.strip().upper() for c in os.getenv("ETL_TARGET_CURRENCIES", "EGP").split(",") if c.strip()]
+
+# =========================
+# Execution engine
+# =========================
+# pandas (default), or duckdb: cleaning rules, dimension builds and the
+# fact_sales joins run as in-process DuckDB SQL with the same outputs (see
+# duckdb_engine). duckdb is opt-in and not the faster path by default: on one
+# core it is slower at every stage (per-step setup and the pandas <-> DuckDB
+# conversion outweigh the joins). Switch only where
+# `benchmark.py --suite engines` shows a win on that host, i.e. several cores
+# and inputs far above the sample size
+ENGINE = os.getenv("ETL_ENGINE", "pandas")
+DUCKDB_THREADS = int(os.getenv("ETL_DUCKDB_THREADS", str(os.cpu_count() or 1)))
+
+# =========================
+# Reports
+# =========================
+# database: charts run GROUP BY queries in the warehouse database;
+# files: the same queries are evaluated with pandas on the data_warehouse layer
+REPORT_SOURCE = os.getenv("ETL_REPORT_SOURCE", "database")
+
+# Charts are rendered headless to files (one per format), in parallel processes;
+# a chart whose data did not change since the last run is not redrawn
+CHARTS_DIR = Path(os.getenv("ETL_CHARTS_DIR", BASE_DIR / "Reports & Visualization" / "Charts"))
+CHART_FORMATS = [fmt.strip() for fmt in os.getenv("ETL_CHART_FORMATS", "png").split(",") if fmt.strip()]
+CHART_WORKERS = int(os.getenv("ETL_CHART_WORKERS", str(min(6, os.cpu_count() or 1))))
+
+# =========================
+# Pipeline DAG (see pipeline_dag)
+# =========================
+# Node outputs and the fingerprints they were built from; a node whose inputs,
+# code and parameters are unchanged is skipped and served from here
+DAG_CACHE_DIR = Path(os.getenv("ETL_DAG_CACHE_DIR", BASE_DIR / ".etl_cache"))
+# Threads running ready nodes concurrently
+DAG_WORKERS = int(os.getenv("ETL_DAG_WORKERS", "4"))
+
+# =========================
+# Instrumentation
+# =========================
+# Per-stage metrics written as a JSON run report to METRICS_DIR (main.py --metrics);
+# PROFILER ("cprofile" or "pyinstrument") also profiles every top-level stage
+INSTRUMENT = os.getenv("ETL_INSTRUMENT", "0") == "1"
+METRICS_DIR = Path(os.getenv("ETL_METRICS_DIR", BASE_DIR / "run_reports"))
+PROFILER = os.getenv("ETL_PROFILER")
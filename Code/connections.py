@@ -0,0 +1,135 @@
+import threading
+import time
+from contextlib import contextmanager
+from sqlalchemy import create_engine, event
+from config import MYSQL_URL, DWH_URL, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_RECYCLE
+
+
+# =========================
+# Engine cache (one pooled engine per DSN)
+# =========================
+ENGINES = {}
+METRICS = {}    # keyed by engine
+ENGINES_LOCK = threading.Lock()
+METRICS_LOCK = threading.Lock()
+CONNECT_STARTED = threading.local()
+
+
+def new_metrics():
+    return {
+        "connections_opened": 0,   # physical connections (TCP + auth handshake)
+        "connect_seconds": 0.0,
+        "checkouts": 0,            # connections handed out by the pool
+        "checkins": 0,
+        "checkout_wait_seconds": 0.0,
+        "max_checkout_wait_seconds": 0.0,
+    }
+
+
+def add_metric(metrics, name, value):
+    with METRICS_LOCK:
+        metrics[name] += value
+
+
+def track_pool(engine, metrics):
+    @event.listens_for(engine, "do_connect")
+    def before_connect(dialect, conn_rec, cargs, cparams):
+        CONNECT_STARTED.value = time.perf_counter()
+
+    @event.listens_for(engine, "connect")
+    def after_connect(dbapi_connection, connection_record):
+        add_metric(metrics, "connections_opened", 1)
+        started = getattr(CONNECT_STARTED, "value", None)
+        if started is not None:
+            add_metric(metrics, "connect_seconds", time.perf_counter() - started)
+            CONNECT_STARTED.value = None
+
+    @event.listens_for(engine, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        add_metric(metrics, "checkouts", 1)
+
+    @event.listens_for(engine, "checkin")
+    def on_checkin(dbapi_connection, connection_record):
+        add_metric(metrics, "checkins", 1)
+
+
+def get_engine(url):
+    with ENGINES_LOCK:
+        engine = ENGINES.get(url)
+        if engine is None:
+            if url.startswith("sqlite"):
+                # SQLite stand-ins (tests, local runs) keep SQLAlchemy's default pool
+                engine = create_engine(url)
+            else:
+                engine = create_engine(
+                    url,
+                    pool_size=DB_POOL_SIZE,
+                    max_overflow=DB_MAX_OVERFLOW,
+                    pool_recycle=DB_POOL_RECYCLE,
+                    pool_pre_ping=True,
+                )
+            METRICS[engine] = new_metrics()
+            track_pool(engine, METRICS[engine])
+            ENGINES[url] = engine
+        return engine
+
+
+def configured_url(url, prefix):
+    if not url:
+        raise RuntimeError(f"No {prefix} database configured: set ETL_{prefix}_URL, or ETL_{prefix}_PASSWORD "
+                           f"(and ETL_{prefix}_USER / _HOST / _PORT / _DB if not the defaults)")
+    return url
+
+
+def mysql_engine():
+    return get_engine(configured_url(MYSQL_URL, "MYSQL"))
+
+
+def dwh_engine():
+    return get_engine(configured_url(DWH_URL, "DWH"))
+
+
+@contextmanager
+def connect(engine):
+    # Same as engine.connect(), but records how long the pool checkout took
+    metrics = METRICS.get(engine)
+    start = time.perf_counter()
+    conn = engine.connect()
+    if metrics is not None:
+        waited = time.perf_counter() - start
+        with METRICS_LOCK:
+            metrics["checkout_wait_seconds"] += waited
+            metrics["max_checkout_wait_seconds"] = max(metrics["max_checkout_wait_seconds"], waited)
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+# =========================
+# Metrics
+# =========================
+def pool_metrics():
+    report = {}
+    for engine in ENGINES.values():
+        metrics = dict(METRICS[engine])
+        metrics["pool_status"] = engine.pool.status()
+        if metrics["checkouts"]:
+            metrics["avg_checkout_wait_seconds"] = metrics["checkout_wait_seconds"] / metrics["checkouts"]
+        report[engine.url.render_as_string(hide_password=True)] = metrics
+    return report
+
+
+def print_pool_metrics():
+    for url, metrics in pool_metrics().items():
+        print(f"  {url}: {metrics['connections_opened']} connections opened "
+              f"({metrics['connect_seconds']:.3f}s), {metrics['checkouts']} checkouts "
+              f"(wait {metrics['checkout_wait_seconds']:.3f}s, max {metrics['max_checkout_wait_seconds']:.3f}s)")
+
+
+def dispose_engines():
+    with ENGINES_LOCK:
+        for engine in ENGINES.values():
+            engine.dispose()
+        ENGINES.clear()
+        METRICS.clear()
@@ -0,0 +1,299 @@
+import importlib.util
+import numpy as np
+import pandas as pd
+from instrumentation import stage
+from quality_rules import compile_masks as compile_date_masks
+from Modeling import (FACT_ORDER_COLUMNS, FACT_ITEM_COLUMNS, FACT_COLUMNS, build_dim_product as pandas_dim_product,
+                      build_dim_customer as pandas_dim_customer, build_dim_store as pandas_dim_store,
+                      build_dim_staff as pandas_dim_staff, build_dim_region as pandas_dim_region,
+                      build_fact_sales as pandas_fact_sales, key_index, report_misses, add_fact_measures)
+from config import ENGINE, DUCKDB_THREADS
+
+
+# =========================
+# DuckDB execution engine
+# =========================
+# ETL_ENGINE=duckdb runs the cleaning rules, the dimension builds and the
+# fact_sales joins as in-process DuckDB SQL over the pandas frames: one
+# multi-threaded plan per step instead of chains of pandas copies. Opt-in:
+# each step pays for a connection and for moving frames in and out of DuckDB,
+# which only parallel joins over large inputs can win back (measured slower on
+# a single core, see config.ENGINE and benchmark.py --suite engines). The outputs
+# are the pandas path's: every input gets a row number so rows keep the pandas
+# order, joins use IS NOT DISTINCT FROM (pandas matches missing keys), and
+# columns get the dtypes the pandas builders produce. duckdb is optional;
+# without it the pandas engine runs.
+ROW = "__row"
+REGION_COLUMNS = ["city", "state", "zip_code"]
+WARNED = []
+
+
+def active_engine(engine=ENGINE):
+    if engine != "duckdb":
+        return "pandas"
+    if importlib.util.find_spec("duckdb") is None:
+        if not WARNED:
+            print("⚠️ duckdb is not installed, running the pandas engine")
+            WARNED.append(engine)
+        return "pandas"
+    return "duckdb"
+
+
+def quote(column):
+    return '"' + str(column).replace('"', '""') + '"'
+
+
+def connect(**frames):
+    # In-memory database per step (steps run in parallel threads); the frames
+    # are scanned in place, with their row number. Frames with pandas'
+    # Arrow-backed strings are handed over as Arrow tables: DuckDB would
+    # convert those columns to Python objects (categoricals stay pandas, they
+    # scan as ENUMs)
+    import duckdb
+    import pyarrow as pa
+    con = duckdb.connect(config={"threads": DUCKDB_THREADS})
+    for name, df in frames.items():
+        df = df.assign(**{ROW: np.arange(len(df))})
+        if any(isinstance(dtype, pd.StringDtype) for dtype in df.dtypes):
+            df = pa.Table.from_pandas(df, preserve_index=False)
+        con.register(name, df)
+    return con
+
+
+def align(result, like):
+    # Dtypes of the pandas result (like); integer columns with missing values
+    # become float64, as they do in pandas merges
+    casts = {}
+    for column, dtype in like.dtypes.items():
+        values = result[column]
+        if values.dtype == dtype:
+            continue
+        if dtype.kind in "iub" and values.isna().any():
+            casts[column] = values.astype("float64")
+        else:
+            casts[column] = values.astype(dtype)
+    return result.assign(**casts) if casts else result
+
+
+def comparable(left, right, columns):
+    # SQL casts keys of different types to one type; pandas compares the values
+    # as they are (an int zip code never equals a str one). Mixed-type columns
+    # (object) have no SQL type at all: such inputs run the pandas builders
+    for column in columns:
+        dtypes = [left[column].dtype, right[column].dtype]
+        if any(dtype == object for dtype in dtypes):
+            return False
+        if pd.api.types.is_numeric_dtype(dtypes[0]) != pd.api.types.is_numeric_dtype(dtypes[1]):
+            return False
+    return True
+
+
+def empty(*frames):
+    return [df.head(0) for df in frames]
+
+
+def first_rows(con, sql, columns, order, like):
+    # drop_duplicates().reset_index(drop=True) of the query: the first row of
+    # every distinct row, in input order
+    selected = ", ".join(quote(c) for c in columns)
+    result = con.sql(
+        f"SELECT {selected} FROM ({sql}) "
+        f"QUALIFY row_number() OVER (PARTITION BY {selected} ORDER BY {order}) = 1 ORDER BY {order}"
+    ).df()
+    return align(result, like)
+
+
+# =========================
+# Cleaning rules
+# =========================
+def compile_masks(df, rules, today):
+    # quality_rules.compile_masks with not_null / unique / positive evaluated in
+    # one query. Dates are still parsed by pandas: pd.to_datetime semantics
+    # (epoch numbers, mixed formats) define what the cleaned columns hold
+    checks = []
+    not_null, unique, positive = rules.get("not_null", []), rules.get("unique", []), rules.get("positive", [])
+    if not_null:
+        checks.append(("not_null", " AND ".join(f"{quote(c)} IS NOT NULL" for c in not_null)))
+    if unique:
+        # Duplicates are only looked for among rows that pass not_null
+        candidate = f"({checks[0][1]})" if not_null else "TRUE"
+        partition = ", ".join(quote(c) for c in unique)
+        checks.append(("unique", f"NOT {candidate} OR row_number() OVER (PARTITION BY {partition}, {candidate} ORDER BY {ROW}) = 1"))
+    for column in positive:
+        checks.append((f"positive:{column}", f"coalesce({quote(column)} > 0, FALSE)"))
+
+    masks = []
+    if checks:
+        with stage("rule", "sql", len(df)):
+            con = connect(t=df[list(dict.fromkeys(not_null + unique + positive))])
+            select = ", ".join(f"{expression} AS p{i}" for i, (_, expression) in enumerate(checks))
+            result = con.sql(f"SELECT {select} FROM t ORDER BY {ROW}").fetchnumpy()
+            masks = [(name, np.asarray(result[f"p{i}"], dtype=bool)) for i, (name, _) in enumerate(checks)]
+            con.close()
+
+    date_masks, parsed_dates = compile_date_masks(df, {"dates_not_in_future": rules.get("dates_not_in_future", [])}, today)
+    return masks + date_masks, parsed_dates
+
+
+# =========================
+# Dimensions
+# =========================
+def build_dim_product(products, category, brands):
+    con = connect(products=products, category=category[["category_id", "category_name"]], brands=brands[["brand_id", "brand_name"]])
+    sql = f"""
+        SELECT p.product_id, p.product_name, c.category_name, b.brand_name, p.model_year, p.list_price,
+               p.{ROW} AS r1, c.{ROW} AS r2, b.{ROW} AS r3
+        FROM products p
+        LEFT JOIN category c ON c.category_id IS NOT DISTINCT FROM p.category_id
+        LEFT JOIN brands b ON b.brand_id IS NOT DISTINCT FROM p.brand_id
+    """
+    like = pandas_dim_product(*empty(products, category, brands))
+    return first_rows(con, sql, like.columns, "r1, r2, r3", like)
+
+
+def region_join(con, table, columns, like):
+    # customers / stores joined to dim_region on (city, state, zip_code)
+    selected = ", ".join(f"{'r' if c == 'region_id' else 't'}.{quote(c)}" for c in columns)
+    sql = f"""
+        SELECT {selected}, t.{ROW} AS r1, r.{ROW} AS r2
+        FROM {table} t
+        LEFT JOIN dim_region r ON r.city IS NOT DISTINCT FROM t.city AND r.state IS NOT DISTINCT FROM t.state
+                              AND r.zip_code IS NOT DISTINCT FROM t.zip_code
+    """
+    return first_rows(con, sql, columns, "r1, r2", like)
+
+
+def build_dim_customer(customers, dim_region):
+    if not comparable(customers, dim_region, REGION_COLUMNS):
+        return pandas_dim_customer(customers, dim_region)
+    like = pandas_dim_customer(*empty(customers, dim_region))
+    return region_join(connect(customers=customers, dim_region=dim_region), "customers", list(like.columns), like)
+
+
+def build_dim_store(stores, dim_region):
+    if not comparable(stores, dim_region, REGION_COLUMNS):
+        return pandas_dim_store(stores, dim_region)
+    like = pandas_dim_store(*empty(stores, dim_region))
+    return region_join(connect(stores=stores, dim_region=dim_region), "stores", list(like.columns), like)
+
+
+def build_dim_staff(staff):
+    like = pandas_dim_staff(staff.head(0))
+    return first_rows(connect(staff=staff), "SELECT * FROM staff", like.columns, ROW, like)
+
+
+def build_dim_region(customers, store, engine=None, mode="full"):
+    # Incremental runs keep the warehouse's surrogate keys (pandas path)
+    if mode == "incremental" or not comparable(customers, store, REGION_COLUMNS):
+        return pandas_dim_region(customers, store, engine, mode)
+    like = pandas_dim_region(*empty(customers, store))
+    con = connect(customers=customers[REGION_COLUMNS], stores=store[REGION_COLUMNS])
+    sql = f"""
+        SELECT city, state, zip_code, 0 AS part, {ROW} AS r FROM customers
+        UNION ALL
+        SELECT city, state, zip_code, 1 AS part, {ROW} AS r FROM stores
+    """
+    dim_region = first_rows(con, sql, REGION_COLUMNS, "part, r", like[REGION_COLUMNS])
+    dim_region.insert(0, "region_id", dim_region.index + 1)
+    return align(dim_region, like)
+
+
+# =========================
+# fact_sales
+# =========================
+def date_id(column):
+    return f"year({column}) * 10000 + month({column}) * 100 + day({column})"
+
+
+def build_fact_sales(orders, order_items, dim_date, dim_product, dim_customer, dim_store, dim_staff):
+    # Same lines, keys and misses as Modeling.build_fact_sales: one join of the
+    # order lines, four key lookups and the date id arithmetic in one plan
+    dates = ["order_date", "required_date", "shipped_date"]
+    orders = orders[FACT_ORDER_COLUMNS].assign(**{c: pd.to_datetime(orders[c], errors="coerce") for c in dates})
+    order_items = order_items[FACT_ITEM_COLUMNS]
+    first_id, last_id = dim_date["date_id"].min(), dim_date["date_id"].max()
+    in_calendar = "BETWEEN $first_id AND $last_id"
+    params = {"first_id": None if pd.isna(first_id) else int(first_id), "last_id": None if pd.isna(last_id) else int(last_id)}
+
+    con = connect(orders=orders, items=order_items, dim_product=dim_product[["product_id"]],
+                  dim_customer=dim_customer[["customer_id", "region_id"]], dim_store=dim_store[["store_id", "region_id"]],
+                  dim_staff=dim_staff[["staff_id"]])
+    # First row per key, as key_index
+    lookups = {
+        name: f"(SELECT *, TRUE AS hit FROM {name} QUALIFY row_number() OVER (PARTITION BY {key} ORDER BY {ROW}) = 1)"
+        for name, key in [("dim_product", "product_id"), ("dim_customer", "customer_id"),
+                          ("dim_store", "store_id"), ("dim_staff", "staff_id")]
+    }
+    con.execute(f"""
+        CREATE TEMP TABLE lines AS
+        SELECT o.order_id, i.item_id, i.product_id, o.customer_id, o.store_id,
+               c.region_id AS customer_region_id, s.region_id AS store_region_id, o.staff_id,
+               {date_id('o.order_date')} AS order_date_id,
+               {date_id('o.required_date')} AS required_date_raw,
+               {date_id('o.shipped_date')} AS shipped_date_raw,
+               i.discount, o.delivery_time_days, o.late_delivery_days, o.late_flag, o.status_priority,
+               i.quantity, i.list_price_local,
+               coalesce({date_id('o.order_date')} {in_calendar}, FALSE) AS date_found,
+               p.hit IS NOT NULL AS product_found, c.hit IS NOT NULL AS customer_found,
+               s.hit IS NOT NULL AS store_found, st.hit IS NOT NULL AS staff_found,
+               o.{ROW} AS r1, i.{ROW} AS r2
+        FROM orders o
+        JOIN items i ON i.order_id IS NOT DISTINCT FROM o.order_id
+        LEFT JOIN {lookups['dim_product']} p ON p.product_id IS NOT DISTINCT FROM i.product_id
+        LEFT JOIN {lookups['dim_customer']} c ON c.customer_id IS NOT DISTINCT FROM o.customer_id
+        LEFT JOIN {lookups['dim_store']} s ON s.store_id IS NOT DISTINCT FROM o.store_id
+        LEFT JOIN {lookups['dim_staff']} st ON st.staff_id IS NOT DISTINCT FROM o.staff_id
+    """, params)
+
+    total, *counts = con.execute(f"""
+        SELECT count(*),
+               count(*) FILTER (NOT date_found), count(*) FILTER (NOT product_found),
+               count(*) FILTER (NOT customer_found), count(*) FILTER (NOT store_found),
+               count(*) FILTER (NOT staff_found),
+               count(*) FILTER (required_date_raw IS NOT NULL AND NOT required_date_raw {in_calendar}),
+               count(*) FILTER (shipped_date_raw IS NOT NULL AND NOT shipped_date_raw {in_calendar}),
+               count(*) FILTER (order_date_id IS NULL),
+               count(*) FILTER (required_date_raw IS NULL), count(*) FILTER (shipped_date_raw IS NULL)
+        FROM lines
+    """, params).fetchone()
+    (date_misses, product_misses, customer_misses, store_misses, staff_misses, required_misses, shipped_misses,
+     order_dates_null, required_null, shipped_null) = counts
+    report_misses({
+        "order_date": (date_misses, "dropped"), "product_id": (product_misses, "dropped"),
+        "customer_id": (customer_misses, "dropped"), "store_id": (store_misses, "dropped"),
+        "staff_id": (staff_misses, "dropped"), "required_date": (required_misses, "left empty"),
+        "shipped_date": (shipped_misses, "left empty"),
+    }, total)
+
+    fact_sales = con.execute(f"""
+        SELECT * REPLACE (
+                   CASE WHEN required_date_raw {in_calendar} THEN required_date_raw END AS required_date_raw,
+                   CASE WHEN shipped_date_raw {in_calendar} THEN shipped_date_raw END AS shipped_date_raw)
+        FROM lines
+        WHERE date_found AND product_found AND customer_found AND store_found AND staff_found
+        ORDER BY r1, r2
+    """, params).df().rename(columns={"required_date_raw": "required_date_id", "shipped_date_raw": "shipped_date_id"})
+    con.close()
+
+    # pandas dtypes: computed keys are float64 as soon as one line had a missing
+    # value, looked up region ids when one line missed its dimension
+    like = pandas_fact_sales(*empty(orders, order_items), dim_date, dim_product, dim_customer, dim_store, dim_staff)
+    like = like[FACT_COLUMNS].astype({
+        "order_date_id": "float64" if order_dates_null else "int64",
+        "required_date_id": "float64" if required_null or required_misses else "int64",
+        "shipped_date_id": "float64" if shipped_null or shipped_misses else "int64",
+        "customer_region_id": "float64" if customer_misses else key_index(dim_customer, "customer_id", "region_id")[1].dtype,
+        "store_region_id": "float64" if store_misses else key_index(dim_store, "store_id", "region_id")[1].dtype,
+    })
+    return add_fact_measures(align(fact_sales[FACT_COLUMNS], like))
+
+
+# Builders used by the pipeline for each engine
+BUILDERS = {
+    "build_dim_product": build_dim_product,
+    "build_dim_customer": build_dim_customer,
+    "build_dim_store": build_dim_store,
+    "build_dim_staff": build_dim_staff,
+    "build_dim_region": build_dim_region,
+    "build_fact_sales": build_fact_sales,
+}
@@ -0,0 +1,228 @@
+import os
+import re
+import sys
+import json
+import time
+import inspect
+import cProfile
+import functools
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from config import INSTRUMENT, METRICS_DIR, PROFILER
+
+try:
+    import resource
+except ImportError:  # Windows: no peak RSS
+    resource = None
+
+
+# =========================
+# Stage metrics
+# =========================
+# Every extract, cleaning rule, transform, dimension build, load and chart runs
+# as a stage: wall / CPU time, rows in / out, peak RSS and bytes read / written
+# are recorded and written as one JSON run report. Stages nest per thread (a
+# rule inside its clean, a load inside its DAG node). With a profiler set, each
+# top-level stage of a thread is profiled to its own file; one profiler runs at
+# a time, so with parallel workers some stages are not profiled.
+SETTINGS = {"enabled": INSTRUMENT, "profiler": PROFILER}
+RUN = {"id": os.getenv("ETL_RUN_ID") or datetime.now().strftime("%Y%m%d_%H%M%S"), "start": time.perf_counter()}
+RUN_METRICS = []
+METRICS_LOCK = threading.Lock()
+PROFILER_LOCK = threading.Lock()
+LOCAL = threading.local()
+
+
+def configure(enabled=True, profiler=None):
+    # Also exported to the environment, for worker processes
+    SETTINGS.update(enabled=enabled, profiler=profiler)
+    os.environ["ETL_INSTRUMENT"] = "1" if enabled else "0"
+    os.environ["ETL_RUN_ID"] = RUN["id"]
+    if profiler:
+        os.environ["ETL_PROFILER"] = profiler
+    else:
+        os.environ.pop("ETL_PROFILER", None)
+
+
+def profile_dir():
+    return METRICS_DIR / f"profiles_{RUN['id']}"
+
+
+def peak_rss_mb():
+    # High-water mark of the whole process
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def io_counters():
+    # (bytes read, bytes written) by the process, files and sockets; None outside Linux.
+    # Process-wide, so stages running at the same time share their I/O
+    try:
+        with open("/proc/self/io", "r") as f:
+            fields = dict(line.split(": ") for line in f.read().splitlines())
+        return int(fields["rchar"]), int(fields["wchar"])
+    except OSError:
+        return None
+
+
+def start_profiler():
+    if not SETTINGS["profiler"] or not PROFILER_LOCK.acquire(blocking=False):
+        return None
+    if SETTINGS["profiler"] == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            print("⚠️ pyinstrument is not installed, profiling with cProfile")
+            SETTINGS["profiler"] = "cprofile"
+        else:
+            profiler = Profiler()
+            profiler.start()
+            return profiler
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+
+def stop_profiler(profiler, label):
+    try:
+        profile_dir().mkdir(parents=True, exist_ok=True)
+        path = profile_dir() / re.sub(r"[^\w.-]+", "_", label)
+        if isinstance(profiler, cProfile.Profile):
+            profiler.disable()
+            path = path.with_suffix(".prof")
+            profiler.dump_stats(path)
+        else:
+            profiler.stop()
+            path = path.with_suffix(".html")
+            path.write_text(profiler.output_html(), encoding="utf-8")
+        return str(path)
+    finally:
+        PROFILER_LOCK.release()
+
+
+def add_record(record):
+    if SETTINGS["enabled"] and record:
+        with METRICS_LOCK:
+            RUN_METRICS.append(record)
+
+
+def clear_stages():
+    # A forked worker process inherits the stage stack of the thread that
+    # started it; its own stages are top-level until add_records nests them
+    LOCAL.stack = []
+
+def record_count():
+    with METRICS_LOCK:
+        return len(RUN_METRICS)
+
+
+def take_records(start):
+    # Records added since record_count() returned start, removed from this
+    # process: a worker process hands them back to the parent (see add_records)
+    with METRICS_LOCK:
+        records = RUN_METRICS[start:]
+        del RUN_METRICS[start:]
+    return records
+
+
+def add_records(records):
+    # Records taken in a worker process; its top-level stages are nested
+    # under the stage of this thread that waited for them
+    parent = current_stage()
+    for record in records:
+        if record["parent"] is None and parent:
+            record["parent"] = f"{parent['kind']}:{parent['name']}"
+        add_record(record)
+
+
+def current_stage():
+    # Record of the innermost stage of this thread (a scratch dict when there is none)
+    stack = getattr(LOCAL, "stack", None)
+    return stack[-1] if stack else {}
+
+
+@contextmanager
+def stage(kind, name, rows_in=None, profile=True):
+    # Yields the stage record; the caller may set record["rows_out"]
+    if not SETTINGS["enabled"]:
+        yield {}
+        return
+
+    stack = LOCAL.__dict__.setdefault("stack", [])
+    record = {
+        "kind": kind, "name": name,
+        "parent": f"{stack[-1]['kind']}:{stack[-1]['name']}" if stack else None,
+        "thread": threading.current_thread().name, "pid": os.getpid(),
+        "rows_in": rows_in, "rows_out": None, "status": "ok",
+    }
+    profiler = start_profiler() if profile and not stack else None
+    stack.append(record)
+    io_before = io_counters()
+    start, cpu_start = time.perf_counter(), time.thread_time()
+    try:
+        yield record
+    except BaseException:
+        record["status"] = "failed"
+        raise
+    finally:
+        io_after = io_counters()
+        record["started_s"] = round(start - RUN["start"], 3)
+        record["wall_s"] = round(time.perf_counter() - start, 4)
+        record["cpu_s"] = round(time.thread_time() - cpu_start, 4)
+        record["peak_rss_mb"] = peak_rss_mb()
+        if io_before and io_after:
+            record["bytes_read"] = io_after[0] - io_before[0]
+            record["bytes_written"] = io_after[1] - io_before[1]
+        stack.pop()
+        if profiler is not None:
+            record["profile"] = stop_profiler(profiler, f"{kind}_{name}")
+        add_record(record)
+
+
+def instrumented(kind, name_arg=None):
+    # Decorator: every call is a stage, named after the function or the value
+    # of its argument name_arg
+    def decorate(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not SETTINGS["enabled"]:
+                return func(*args, **kwargs)
+            name = signature.bind(*args, **kwargs).arguments[name_arg] if name_arg else func.__name__
+            with stage(kind, name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+# =========================
+# Run report
+# =========================
+def write_run_report(path=None, top=10):
+    if not SETTINGS["enabled"]:
+        return None
+    path = Path(path) if path else METRICS_DIR / f"run_{RUN['id']}.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with METRICS_LOCK:
+        stages = sorted(RUN_METRICS, key=lambda r: r["started_s"])
+    report = {
+        "run_id": RUN["id"],
+        "wall_s": round(time.perf_counter() - RUN["start"], 3),
+        "peak_rss_mb": peak_rss_mb(),
+        "profiler": SETTINGS["profiler"],
+        "stages": stages,
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, default=str)
+
+    print(f"--- Slowest stages (of {len(stages)}) ---")
+    for record in sorted(stages, key=lambda r: r["wall_s"], reverse=True)[:top]:
+        rows = "" if record["rows_out"] is None else f" {record['rows_out']} rows"
+        print(f"  {record['kind'] + ':' + str(record['name']):<40} {record['wall_s']:>8.3f}s wall {record['cpu_s']:>8.3f}s cpu{rows}")
+    print(f"📊 Run report -> {path}")
+    return path
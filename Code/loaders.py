@@ -0,0 +1,268 @@
+import io
+import pandas as pd
+from sqlalchemy import text, inspect, bindparam
+from schemas import apply_schema
+from instrumentation import instrumented, current_stage
+from config import LOAD_BATCH_SIZE, PARTITION_FACT_SALES
+
+
+# =========================
+# Declared keys
+# =========================
+TABLE_KEYS = {
+    "dim_date": ["date_id"],
+    "dim_region": ["region_id"],
+    "dim_product": ["product_id"],
+    "dim_customer": ["customer_id"],
+    "dim_store": ["store_id"],
+    "dim_staff": ["staff_id"],
+    "fact_sales": ["sales_key"],
+    "agg_sales_daily": ["order_date_id"],
+    "agg_sales_product": ["product_id"],
+    "agg_sales_store_region": ["store_region_id"],
+    "agg_sales_staff": ["staff_id"],
+}
+
+TABLE_INDEXES = {
+    "fact_sales": [
+        "order_id",
+        "product_id",
+        "customer_id",
+        "store_id",
+        "customer_region_id",
+        "store_region_id",
+        "staff_id",
+        "order_date_id",
+        "required_date_id",
+        "shipped_date_id",
+    ],
+}
+
+
+# Values per IN (...) list when rows are selected / deleted by key
+IN_LIST_SIZE = 1000
+
+# Range-partitioned by month on this column (Postgres only)
+TABLE_PARTITIONS = {"fact_sales": "order_date_id"} if PARTITION_FACT_SALES else {}
+
+
+# =========================
+# Monthly partitions (Postgres)
+# =========================
+def month_ranges(date_ids):
+    # yyyymmdd ids -> (yyyymm, lower bound, upper bound) per month present
+    months = sorted(set((pd.Series(date_ids).dropna().astype("int64") // 100).tolist()))
+    for yyyymm in months:
+        year, month = divmod(yyyymm, 100)
+        next_month = (year + 1) * 100 + 1 if month == 12 else yyyymm + 1
+        yield yyyymm, yyyymm * 100, next_month * 100
+
+
+def create_partitions(conn, table_name, date_ids):
+    # <table>_p<yyyymm> per month present plus a default partition for null dates
+    quote = conn.dialect.identifier_preparer.quote
+    created = []
+    for yyyymm, lower, upper in month_ranges(date_ids):
+        partition = f"{table_name}_p{yyyymm}"
+        conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {quote(partition)} PARTITION OF {quote(table_name)} "
+            f"FOR VALUES FROM ({lower}) TO ({upper})"
+        ))
+        created.append(partition)
+    partition = f"{table_name}_pdefault"
+    conn.execute(text(f"CREATE TABLE IF NOT EXISTS {quote(partition)} PARTITION OF {quote(table_name)} DEFAULT"))
+    created.append(partition)
+    return created
+
+
+# =========================
+# Reading back
+# =========================
+def table_exists(engine, table_name):
+    return inspect(engine).has_table(table_name)
+
+
+def read_loaded_table(engine, table_name, columns=None):
+    # Current warehouse content (with the table's schema), or None on the very first load
+    if not table_exists(engine, table_name):
+        return None
+    with engine.connect() as conn:
+        quote = conn.dialect.identifier_preparer.quote
+        select = ", ".join(quote(c) for c in columns) if columns else "*"
+        return apply_schema(table_name, pd.read_sql(text(f"SELECT {select} FROM {quote(table_name)}"), conn), record=False)
+
+
+def read_loaded_rows(engine, table_name, column, values, columns=None, batch_size=IN_LIST_SIZE):
+    # Like read_loaded_table, restricted to the rows whose column is one of values
+    values = pd.Series(values).drop_duplicates().tolist()
+    if not table_exists(engine, table_name):
+        return None
+    with engine.connect() as conn:
+        quote = conn.dialect.identifier_preparer.quote
+        select = ", ".join(quote(c) for c in columns) if columns else "*"
+        query = text(f"SELECT {select} FROM {quote(table_name)} WHERE {quote(column)} IN :values").bindparams(
+            bindparam("values", expanding=True))
+        frames = [pd.read_sql(query, conn, params={"values": values[start:start + batch_size]})
+                  for start in range(0, len(values), batch_size)]
+        if not frames:
+            frames = [pd.read_sql(text(f"SELECT {select} FROM {quote(table_name)} WHERE 1 = 0"), conn)]
+    return apply_schema(table_name, pd.concat(frames, ignore_index=True), record=False)
+
+
+def max_loaded_value(engine, table_name, column):
+    # Largest value of column in the loaded table, None when there is none
+    if not table_exists(engine, table_name):
+        return None
+    with engine.connect() as conn:
+        quote = conn.dialect.identifier_preparer.quote
+        return conn.execute(text(f"SELECT MAX({quote(column)}) FROM {quote(table_name)}")).scalar()
+
+
+def delete_loaded_rows(engine, table_name, column, values, batch_size=IN_LIST_SIZE):
+    # Deletes the rows whose column is one of values; returns the number deleted
+    values = pd.Series(values).drop_duplicates().tolist()
+    if not values or not table_exists(engine, table_name):
+        return 0
+    deleted = 0
+    with engine.begin() as conn:
+        quote = conn.dialect.identifier_preparer.quote
+        delete = text(f"DELETE FROM {quote(table_name)} WHERE {quote(column)} IN :values").bindparams(
+            bindparam("values", expanding=True))
+        for start in range(0, len(values), batch_size):
+            deleted += conn.execute(delete, {"values": values[start:start + batch_size]}).rowcount
+    print(f"  Deleted {deleted} rows from '{table_name}'")
+    return deleted
+
+
+# =========================
+# COPY (Postgres) / batched INSERT (SQLite & co.)
+# =========================
+def copy_into(conn, df, table_name, batch_size=LOAD_BATCH_SIZE):
+    quote = conn.dialect.identifier_preparer.quote
+    columns = ", ".join(quote(c) for c in df.columns)
+    copy_sql = f"COPY {quote(table_name)} ({columns}) FROM STDIN WITH (FORMAT csv)"
+
+    cursor = conn.connection.dbapi_connection.cursor()
+    try:
+        for start in range(0, len(df), batch_size):
+            block = df.iloc[start:start + batch_size].to_csv(index=False, header=False)
+            if hasattr(cursor, "copy"):
+                # psycopg 3
+                with cursor.copy(copy_sql) as copy:
+                    copy.write(block)
+            else:
+                # psycopg2
+                cursor.copy_expert(copy_sql, io.StringIO(block))
+    finally:
+        cursor.close()
+
+
+def insert_into(conn, df, table_name, batch_size=LOAD_BATCH_SIZE):
+    df.to_sql(table_name, conn, if_exists="append", index=False, chunksize=batch_size)
+
+
+# =========================
+# Bulk load + atomic swap
+# =========================
+def bulk_load(df, table_name, engine, primary_key=None, indexes=None):
+    # Loads df into <table>__staging and swaps it in within one transaction:
+    # readers keep seeing the previous table until the new one is complete.
+    bulk_load_chunks([df], table_name, engine, primary_key, indexes)
+
+
+@instrumented("load", "table_name")
+def bulk_load_chunks(chunks, table_name, engine, primary_key=None, indexes=None):
+    # Same as bulk_load for a stream of DataFrames (the first one defines the
+    # schema); only one chunk is held at a time.
+    primary_key = TABLE_KEYS.get(table_name) if primary_key is None else primary_key
+    indexes = TABLE_INDEXES.get(table_name, []) if indexes is None else indexes
+    staging_name = f"{table_name}__staging"
+
+    with engine.begin() as conn:
+        quote = conn.dialect.identifier_preparer.quote
+        is_postgres = conn.dialect.name == "postgresql"
+        partition_column = TABLE_PARTITIONS.get(table_name) if is_postgres else None
+
+        conn.execute(text(f"DROP TABLE IF EXISTS {quote(staging_name)}"))
+        rows = 0
+        created = False
+        partitions = {}
+        for df in chunks:
+            if not created:
+                # Postgres names the key index after the table, so it is added after the
+                # rename; elsewhere (SQLite) the key has to be declared up front
+                ddl = pd.io.sql.get_schema(df, staging_name, keys=None if is_postgres else primary_key, con=conn)
+                if partition_column:
+                    ddl = ddl.rstrip().rstrip(";") + f" PARTITION BY RANGE ({quote(partition_column)})"
+                conn.execute(text(ddl))
+                created = True
+            if partition_column:
+                partitions.update(dict.fromkeys(create_partitions(conn, staging_name, df[partition_column])))
+
+            if is_postgres:
+                copy_into(conn, df, staging_name)
+            else:
+                insert_into(conn, df, staging_name)
+            rows += len(df)
+
+        if not created:
+            print(f"  Nothing to load into '{table_name}'")
+            return
+
+        conn.execute(text(f"DROP TABLE IF EXISTS {quote(table_name)}"))
+        conn.execute(text(f"ALTER TABLE {quote(staging_name)} RENAME TO {quote(table_name)}"))
+        for partition in partitions:
+            final_name = table_name + partition[len(staging_name):]
+            conn.execute(text(f"ALTER TABLE {quote(partition)} RENAME TO {quote(final_name)}"))
+        if is_postgres and primary_key:
+            # Keys of a partitioned table must include the partition column
+            if partition_column and partition_column not in primary_key:
+                primary_key = list(primary_key) + [partition_column]
+            key_columns = ", ".join(quote(c) for c in primary_key)
+            conn.execute(text(f"ALTER TABLE {quote(table_name)} ADD PRIMARY KEY ({key_columns})"))
+        for column in indexes:
+            index_name = f"ix_{table_name}_{column}"
+            conn.execute(text(f"CREATE INDEX {quote(index_name)} ON {quote(table_name)} ({quote(column)})"))
+
+    current_stage()["rows_out"] = rows
+    print(f"  Loaded {rows} rows into '{table_name}'")
+
+
+# =========================
+# Merge (upsert) load
+# =========================
+@instrumented("load", "table_name")
+def merge_load(df, table_name, engine, key_columns=None):
+    # Upserts df by key: rows whose key already exists are replaced, the others
+    # inserted. The delta goes through the same COPY path as bulk_load into
+    # <table>__delta, then DELETE matching keys + INSERT run in one transaction.
+    key_columns = TABLE_KEYS[table_name] if key_columns is None else key_columns
+    if not table_exists(engine, table_name):
+        return bulk_load(df, table_name, engine)
+    if df.empty:
+        print(f"  No changes for '{table_name}'")
+        return
+
+    delta_name = f"{table_name}__delta"
+    with engine.begin() as conn:
+        quote = conn.dialect.identifier_preparer.quote
+        table, delta = quote(table_name), quote(delta_name)
+        columns = ", ".join(quote(c) for c in df.columns)
+        match = " AND ".join(f"{delta}.{quote(c)} = {table}.{quote(c)}" for c in key_columns)
+
+        conn.execute(text(f"DROP TABLE IF EXISTS {delta}"))
+        conn.execute(text(pd.io.sql.get_schema(df, delta_name, con=conn)))
+        if conn.dialect.name == "postgresql":
+            copy_into(conn, df, delta_name)
+        else:
+            insert_into(conn, df, delta_name)
+
+        if conn.dialect.name == "postgresql" and table_name in TABLE_PARTITIONS:
+            create_partitions(conn, table_name, df[TABLE_PARTITIONS[table_name]])
+
+        deleted = conn.execute(text(f"DELETE FROM {table} WHERE EXISTS (SELECT 1 FROM {delta} WHERE {match})")).rowcount
+        conn.execute(text(f"INSERT INTO {table} ({columns}) SELECT {columns} FROM {delta}"))
+        conn.execute(text(f"DROP TABLE {delta}"))
+
+    current_stage()["rows_out"] = len(df)
+    print(f"  Merged {len(df)} rows into '{table_name}' ({deleted} updated, {len(df) - deleted} inserted)")
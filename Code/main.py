@@ -1,15 +1,53 @@
+import argparse
 from Extraction import run_extraction
-from cleaning_transformations import run_cleaning_transformations
-from Modeling import run_modeling
+from pipeline_dag import run_pipeline, build_nodes
 from Visualization import run_visualization
+from stage_context import StageContext
+from instrumentation import configure, stage, write_run_report
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run the ETL pipeline")
+    parser.add_argument("--target", action="append", help="Build only this node and its stale ancestors (repeatable), e.g. dim_region")
+    parser.add_argument("--force", action="store_true", help="Rebuild the selected nodes even if their inputs are unchanged")
+    parser.add_argument("--skip-extraction", action="store_true", help="Reuse the consolidated layer as it is")
+    parser.add_argument("--skip-visualization", action="store_true")
+    parser.add_argument("--list", action="store_true", help="List the pipeline nodes and exit")
+    parser.add_argument("--metrics", action="store_true", help="Write a JSON run report with per-stage metrics to run_reports/")
+    parser.add_argument("--profile", choices=["cprofile", "pyinstrument"], help="Also profile every stage (implies --metrics)")
+    return parser.parse_args()
 
 def main():
+    args = parse_args()
+    if args.list:
+        for name, node in build_nodes().items():
+            print(f"{name:<25} <- {', '.join(node['inputs'])}")
+        return
+
+    if args.metrics or args.profile:
+        configure(enabled=True, profiler=args.profile)
+
     print("🚀 ETL Pipeline Started")
 
-    run_extraction()
-    run_cleaning_transformations()
-    run_modeling()
-    run_visualization()
+    # Cleaning and modeling run as one DAG of datasets: nodes whose inputs,
+    # code and settings are unchanged since the last run are skipped.
+    # Nodes hand their DataFrames over in memory, every layer is still
+    # written to disk in the background
+    try:
+        if not args.skip_extraction:
+            with stage("phase", "extraction", profile=False):
+                run_extraction()
+        context = StageContext()
+        try:
+            with stage("phase", "pipeline", profile=False):
+                run_pipeline(args.target, args.force, context)
+        finally:
+            context.close()
+        if not args.skip_visualization:
+            with stage("phase", "visualization", profile=False):
+                run_visualization()
+    finally:
+        # Also written when a stage failed: the report shows which one
+        write_run_report()
 
     print("🎯 ETL Pipeline Finished Successfully")
 
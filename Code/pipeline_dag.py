@@ -0,0 +1,375 @@
+import json
+import time
+import hashlib
+import threading
+from contextlib import ExitStack
+from pathlib import Path
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+import pandas as pd
+from stage_context import StageContext
+from schemas import MEMORY_STATS, print_memory_report
+from instrumentation import stage, clear_stages, record_count, take_records, add_records
+from storage import table_path
+from connections import dwh_engine
+from Extraction import file_fingerprint, changed_orders, clear_changed_orders
+from cleaning_transformations import clean_table, TRANSFORMS, TRANSFORM_PARAMS, ORDER_STATUS_LOOKUP
+from Modeling import (DATE_COLUMNS, build_dim_date, build_dim_region, build_dim_product, build_dim_customer,
+                      build_dim_store, build_dim_staff, build_fact_sales, load_dimension, load_fact_sales,
+                      build_dim_date_chunked, load_calendar, frame_chunks, iter_fact_sales, load_fact_sales_chunks,
+                      load_rollups)
+import duckdb_engine
+from duckdb_engine import active_engine
+from config import (CLEANING_RULES, MODELING_MODE, DWH_URL, DAG_CACHE_DIR, DAG_WORKERS, CLEANING_WORKERS,
+                    FACT_SALES_OUT_OF_CORE, ENGINE, WAREHOUSE_ARROW)
+
+
+# =========================
+# Nodes
+# =========================
+# Every dataset is a node: the datasets it is built from ("inputs"), a function
+# run(context, *input_dfs) that builds it and hands it to the context / warehouse,
+# the parameters and code modules it depends on. Source nodes are the
+# consolidated files written by the extraction. A cached input is loaded from
+# the DAG cache, never from the stage files (they may be stale or not written).
+# CPU-bound nodes split their work out as a "task": a picklable function of the
+# input frames, run in a worker process (CLEANING_WORKERS > 1); run(context,
+# result) then hands the result over in the main process.
+CODE_DIR = Path(__file__).resolve().parent
+CLEANING_CODE = ["cleaning_transformations.py", "quality_rules.py", "duckdb_engine.py"]
+MODELING_CODE = ["Modeling.py", "loaders.py", "rollups.py", "duckdb_engine.py"]
+PANDAS_BUILDERS = {
+    "build_dim_product": build_dim_product,
+    "build_dim_customer": build_dim_customer,
+    "build_dim_store": build_dim_store,
+    "build_dim_staff": build_dim_staff,
+    "build_dim_region": build_dim_region,
+    "build_fact_sales": build_fact_sales,
+}
+
+
+def clean_node(table):
+    def run(context, clean):
+        return context.put("staging_1", f"cleaned_{table}", clean)
+    return run
+
+
+def transform_node(name, func):
+    def run(context, *inputs):
+        with stage("transform", name, len(inputs[0])) as record:
+            df = func(*inputs)
+            record["rows_out"] = len(df)
+        return context.put("staging_2", name, df)
+    return run
+
+
+def lookup_node(context):
+    return context.put("staging_2", "order_status_lookup", ORDER_STATUS_LOOKUP)
+
+
+def dimension_node(name, build, mode):
+    def run(context, *inputs):
+        with stage("build", name) as record:
+            dim = build(*inputs)
+            record["rows_out"] = len(dim)
+        return load_dimension(dim, name, dwh_engine(), context, mode)
+    return run
+
+
+def dim_date_node(mode, out_of_core):
+    def run(context, orders):
+        with stage("build", "dim_date"):
+            # Incremental: the stored calendar only needs extending to the changed orders
+            changed = changed_orders() if mode == "incremental" else None
+            if changed is not None:
+                orders = orders[orders["order_id"].isin(changed)]
+            if out_of_core:
+                dim_date = build_dim_date_chunked(frame_chunks(context, "staging_2", "Transformed_orders", orders),
+                                                  load_calendar())
+            else:
+                dim_date = build_dim_date({"orders": {"df": orders, "cols": DATE_COLUMNS}}, load_calendar())
+        return load_dimension(dim_date, "dim_date", dwh_engine(), context, mode)
+    return run
+
+
+def dim_region_node(mode, build):
+    def run(context, customers, stores):
+        with stage("build", "dim_region"):
+            dim_region = build(customers, stores, dwh_engine(), mode)
+        return load_dimension(dim_region, "dim_region", dwh_engine(), context, mode)
+    return run
+
+
+def fact_sales_node(mode, out_of_core, build):
+    # Also loads the rollups, built in the same pass over the fact lines
+    def run(context, orders, order_items, *dims):
+        if out_of_core:
+            # Cached output is the per-chunk summary, not the table; the
+            # rollups are combined from the partials collected per chunk
+            fact_chunks = iter_fact_sales(
+                frame_chunks(context, "staging_2", "Transformed_orders", orders),
+                frame_chunks(context, "staging_2", "Transformed_order_items", order_items),
+                *dims,
+            )
+            rollup_partials = {}
+            with stage("build", "fact_sales") as record:
+                summary = load_fact_sales_chunks(fact_chunks, dwh_engine(), context, rollup_partials)
+                record["rows_out"] = int(summary["rows"].sum())
+            load_rollups(dwh_engine(), context, mode, partials=rollup_partials)
+            clear_changed_orders()
+            return summary
+        # Incremental: only the orders extracted since the last run are rebuilt
+        changed = changed_orders() if mode == "incremental" else None
+        if changed is not None:
+            orders = orders[orders["order_id"].isin(changed)]
+            order_items = order_items[order_items["order_id"].isin(changed)]
+        with stage("build", "fact_sales", len(order_items)) as record:
+            fact_sales = build(orders, order_items, *dims)
+            record["rows_out"] = len(fact_sales)
+        fact_sales, changes = load_fact_sales(fact_sales, dwh_engine(), context, mode, changed)
+        load_rollups(dwh_engine(), context, mode, fact_sales=fact_sales, changes=changes)
+        clear_changed_orders()
+        return fact_sales
+    return run
+
+
+def build_nodes(mode=MODELING_MODE, engine=ENGINE):
+    # The engine is a parameter of the nodes it runs: switching it rebuilds them
+    engine = active_engine(engine)
+    build = duckdb_engine.BUILDERS if engine == "duckdb" else PANDAS_BUILDERS
+    nodes = {}
+    for table, rules in CLEANING_RULES.items():
+        nodes[f"consolidated_{table}"] = {"source": table, "inputs": []}
+        nodes[f"cleaned_{table}"] = {
+            "inputs": [f"consolidated_{table}"],
+            "task": partial(clean_table, table, rules=rules, engine=engine),
+            "run": clean_node(table),
+            "params": {"rules": rules, "engine": engine},
+            "code": CLEANING_CODE,
+        }
+    for name, (func, tables) in TRANSFORMS.items():
+        nodes[name] = {
+            "inputs": [f"cleaned_{table}" for table in tables],
+            "run": transform_node(name, func),
+            "params": TRANSFORM_PARAMS.get(name),
+            "code": CLEANING_CODE,
+        }
+    nodes["order_status_lookup"] = {"inputs": [], "run": lookup_node, "params": None, "code": CLEANING_CODE}
+
+    # Warehouse nodes also load their table, so the target database is a parameter
+    out_of_core = FACT_SALES_OUT_OF_CORE and mode == "full"
+    modeling = {
+        "dim_date": (dim_date_node(mode, out_of_core), ["Transformed_orders"]),
+        "dim_region": (dim_region_node(mode, build["build_dim_region"]), ["Transformed_customers", "cleaned_stores"]),
+        "dim_product": (dimension_node("dim_product", build["build_dim_product"], mode), ["cleaned_products", "cleaned_categories", "cleaned_brands"]),
+        "dim_customer": (dimension_node("dim_customer", build["build_dim_customer"], mode), ["Transformed_customers", "dim_region"]),
+        "dim_store": (dimension_node("dim_store", build["build_dim_store"], mode), ["cleaned_stores", "dim_region"]),
+        "dim_staff": (dimension_node("dim_staff", build["build_dim_staff"], mode), ["cleaned_staffs"]),
+        "fact_sales": (fact_sales_node(mode, out_of_core, build["build_fact_sales"]), ["Transformed_orders", "Transformed_order_items", "dim_date",
+                                               "dim_product", "dim_customer", "dim_store", "dim_staff"]),
+    }
+    for name, (run, inputs) in modeling.items():
+        nodes[name] = {"inputs": inputs, "run": run,
+                       "params": {"mode": mode, "dwh": DWH_URL, "out_of_core": out_of_core, "engine": engine,
+                                  "warehouse_arrow": WAREHOUSE_ARROW},
+                       "code": MODELING_CODE}
+    return nodes
+
+
+def run_task(task, *inputs):
+    # Runs in a worker process: the stage records the task creates there and its
+    # own run time go back with its result
+    clear_stages()
+    start = record_count()
+    started = time.perf_counter()
+    result = task(*inputs)
+    return result, take_records(start), time.perf_counter() - started
+
+
+def ancestors(nodes, targets):
+    # The targets and everything they are (transitively) built from
+    selected = set()
+    stack = list(targets)
+    while stack:
+        name = stack.pop()
+        if name not in nodes:
+            raise KeyError(f"Unknown pipeline node '{name}'")
+        if name not in selected:
+            selected.add(name)
+            stack.extend(nodes[name]["inputs"])
+    return selected
+
+
+# =========================
+# Fingerprints & cache
+# =========================
+MANIFEST_FILE = DAG_CACHE_DIR / "manifest.json"
+
+
+def load_manifest():
+    if not MANIFEST_FILE.exists():
+        return {}
+    with open(MANIFEST_FILE, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_manifest(manifest):
+    DAG_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_file = MANIFEST_FILE.with_suffix(".json.tmp")
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    tmp_file.replace(MANIFEST_FILE)
+
+
+def cache_path(name):
+    return DAG_CACHE_DIR / f"{name}.pkl"
+
+
+def code_version(files):
+    return hashlib.sha256(b"".join((CODE_DIR / file).read_bytes() for file in files)).hexdigest()
+
+
+def node_fingerprint(node, input_hashes):
+    payload = json.dumps({
+        "code": code_version(node["code"]),
+        "params": node["params"],
+        "inputs": input_hashes,
+    }, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def output_hash(df):
+    # Content hash of a node's output: an unchanged output lets the nodes
+    # downstream of a rebuilt node be skipped (early cutoff)
+    sha256 = hashlib.sha256()
+    sha256.update(json.dumps([[str(c), str(t)] for c, t in df.dtypes.items()]).encode("utf-8"))
+    sha256.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return sha256.hexdigest()
+
+
+def source_hash(table, entry):
+    # File hash of a consolidated table; reused while size and mtime are unchanged
+    path = table_path("consolidated", table)
+    stat = path.stat()
+    if entry and entry.get("size") == stat.st_size and entry.get("mtime") == stat.st_mtime_ns:
+        return entry
+    return {"output_hash": file_fingerprint(path), "size": stat.st_size, "mtime": stat.st_mtime_ns}
+
+
+# =========================
+# Runner
+# =========================
+def run_pipeline(targets=None, force=False, context=None, workers=DAG_WORKERS, mode=MODELING_MODE,
+                 task_workers=CLEANING_WORKERS):
+    print(f"🔹 Pipeline DAG started ({mode})")
+    standalone = context is None
+    if standalone:
+        context = StageContext()
+    nodes = build_nodes(mode)
+    selected = ancestors(nodes, targets or list(nodes))
+    MEMORY_STATS.clear()
+    manifest = load_manifest()
+    manifest_lock = threading.Lock()
+    outputs = {}
+    hashes = {}
+    report = {}
+    transfers = {}
+    pool = {}
+    pool_lock = threading.Lock()
+
+    def value(name):
+        # Output of a node that ran in this run, its cached copy, or the source file
+        if name in outputs:
+            return outputs[name]
+        node = nodes[name]
+        if "source" in node:
+            return context.get("consolidated", node["source"])
+        outputs[name] = pd.read_pickle(cache_path(name))
+        return outputs[name]
+
+    def process_pool():
+        # Started by the first task that runs: a fully cached run never forks
+        with pool_lock:
+            if "processes" not in pool:
+                pool["processes"] = pools.enter_context(ProcessPoolExecutor(max_workers=task_workers))
+            return pool["processes"]
+
+    def run_node(name, fingerprint):
+        start = time.perf_counter()
+        node = nodes[name]
+        with stage("node", name) as record:
+            inputs = [value(i) for i in node["inputs"]]
+            if "task" in node:
+                # The CPU-bound part runs in a worker process, its result is handed over here.
+                # One task worker means in-process: no point paying for process start-up and pickling
+                if task_workers <= 1:
+                    result = node["task"](*inputs)
+                else:
+                    submitted = time.perf_counter()
+                    result, records, task_seconds = process_pool().submit(run_task, node["task"], *inputs).result()
+                    add_records(records)
+                    # Pickling the frames both ways (and any wait for a free worker)
+                    transfers[name] = record["transfer_s"] = round(time.perf_counter() - submitted - task_seconds, 4)
+                df = node["run"](context, result)
+            else:
+                df = node["run"](context, *inputs)
+            record["rows_out"] = len(df)
+        digest = output_hash(df)
+        df.to_pickle(cache_path(name))
+        with manifest_lock:
+            manifest[name] = {"fingerprint": fingerprint, "output_hash": digest}
+            save_manifest(manifest)
+        return df, digest, time.perf_counter() - start
+
+    DAG_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    pending = [name for name in nodes if name in selected]
+    # The process pool, once started, is shut down with the run (see process_pool)
+    with ExitStack() as pools, ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {}
+        while pending or futures:
+            # Decide every node whose inputs are settled: skip it or submit it
+            for name in list(pending):
+                node = nodes[name]
+                if not all(i in hashes for i in node["inputs"]):
+                    continue
+                pending.remove(name)
+                if "source" in node:
+                    entry = source_hash(node["source"], manifest.get(name))
+                    with manifest_lock:
+                        manifest[name] = entry
+                    hashes[name] = entry["output_hash"]
+                    report[name] = ("source", 0.0)
+                    continue
+                fingerprint = node_fingerprint(node, {i: hashes[i] for i in node["inputs"]})
+                entry = manifest.get(name)
+                if not force and entry and entry["fingerprint"] == fingerprint and cache_path(name).exists():
+                    hashes[name] = entry["output_hash"]
+                    report[name] = ("cached", 0.0)
+                    continue
+                futures[executor.submit(run_node, name, fingerprint)] = name
+
+            if not futures:
+                continue
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = futures.pop(future)
+                outputs[name], hashes[name], seconds = future.result()
+                report[name] = ("ran", seconds)
+
+    with manifest_lock:
+        save_manifest(manifest)
+
+    print("--- Pipeline nodes ---")
+    for name in nodes:
+        if name in report and report[name][0] != "source":
+            status, seconds = report[name]
+            transfer = f"  ({transfers[name]:.3f}s transfer)" if name in transfers else ""
+            print(f"  {name:<25} {status:<8} {seconds:.3f}s{transfer}")
+    ran = sum(1 for status, _ in report.values() if status == "ran")
+    print(f"  {ran} node(s) rebuilt, {sum(1 for s, _ in report.values() if s == 'cached')} skipped (unchanged)")
+    print_memory_report()
+
+    if standalone:
+        context.close()
+    print("✅ Pipeline DAG finished")
+    return report
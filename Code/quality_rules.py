@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+from instrumentation import stage
+
+
+# =========================
+# Rule engine
+# =========================
+# Every rule becomes a boolean "passes" mask over the original rows; the masks
+# are combined and the table is filtered once at the end.
+def compile_masks(df, rules, today):
+    masks = []
+    parsed_dates = {}
+
+    not_null = rules.get("not_null")
+    if not_null:
+        with stage("rule", "not_null", len(df)) as record:
+            masks.append(("not_null", df[not_null].notna().all(axis=1).to_numpy()))
+            record["rows_out"] = int(masks[-1][1].sum())
+
+    unique = rules.get("unique")
+    if unique:
+        # Duplicates are only looked for among rows that survived not_null,
+        # the first occurrence is kept
+        with stage("rule", "unique", len(df)) as record:
+            candidates = np.logical_and.reduce([m for _, m in masks]) if masks else np.ones(len(df), dtype=bool)
+            duplicated = np.zeros(len(df), dtype=bool)
+            duplicated[candidates] = df.loc[candidates, unique].duplicated(keep="first").to_numpy()
+            masks.append(("unique", ~duplicated))
+            record["rows_out"] = int(masks[-1][1].sum())
+
+    for column in rules.get("positive", []):
+        with stage("rule", f"positive:{column}", len(df)) as record:
+            masks.append((f"positive:{column}", (df[column] > 0).to_numpy()))
+            record["rows_out"] = int(masks[-1][1].sum())
+
+    for column in rules.get("dates_not_in_future", []):
+        with stage("rule", f"not_in_future:{column}", len(df)) as record:
+            parsed_dates[column] = pd.to_datetime(df[column], errors="coerce")
+            masks.append((f"not_in_future:{column}", (parsed_dates[column] <= today).to_numpy()))
+            record["rows_out"] = int(masks[-1][1].sum())
+
+    return masks, parsed_dates
+
+
+def apply_rules(df, rules, today=None, compile=compile_masks):
+    # Returns (clean rows, {rule: rejected count}, rejected rows with a rejected_by column).
+    # compile: compile_masks, or the DuckDB engine's (see duckdb_engine)
+    today = pd.Timestamp.today() if today is None else today
+    masks, parsed_dates = compile(df, rules, today)
+
+    keep = np.ones(len(df), dtype=bool)
+    rejected_by = np.full(len(df), None, dtype=object)
+    reject_counts = {}
+    for name, passes in masks:
+        # Each rejected row is attributed to the first rule it fails
+        first_failure = keep & ~passes
+        reject_counts[name] = int(first_failure.sum())
+        rejected_by[first_failure] = name
+        keep &= passes
+
+    # The single copy of the table; date columns are stored in their parsed form
+    clean = df.take(np.flatnonzero(keep))
+    for column, values in parsed_dates.items():
+        clean[column] = values.to_numpy()[keep]
+
+    rejected = df.take(np.flatnonzero(~keep)).assign(rejected_by=rejected_by[~keep])
+    return clean, reject_counts, rejected
@@ -0,0 +1,123 @@
+import sys
+import json
+import time
+from pathlib import Path
+import requests
+import pandas as pd
+from config import (OXR_APP_ID, RATES_DIR, RATES_TTL_HOURS, RATES_TIMEOUT, RATES_OFFLINE,
+                    RATES_BACKFILL_FREQ)
+
+
+# =========================
+# Local exchange-rate store
+# =========================
+# One openexchangerates.org response per day: RATES_DIR/<yyyy-mm-dd>.json.
+# latest.json remembers when the latest rates were fetched and their ETag,
+# for the TTL and the conditional refresh.
+API_URL = "https://openexchangerates.org/api"
+LATEST_FILE = RATES_DIR / "latest.json"
+DAY_PATTERN = "????-??-??.json"
+
+
+def day_file(day):
+    return RATES_DIR / f"{pd.Timestamp(day).date().isoformat()}.json"
+
+
+def read_json(path):
+    if not path.exists():
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_json(path, data):
+    RATES_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_file = path.with_suffix(".json.tmp")
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+    tmp_file.replace(path)
+
+
+def response_day(data):
+    return pd.Timestamp(data["timestamp"], unit="s").date()
+
+
+def stored_days():
+    return sorted(file.stem for file in RATES_DIR.glob(DAY_PATTERN))
+
+
+def fetch(path, etag=None):
+    # (response JSON, ETag); JSON is None when the server answers 304 Not Modified
+    if not OXR_APP_ID:
+        raise RuntimeError("ETL_OXR_APP_ID is not set: the exchange rates API needs an app id "
+                           "(or run offline with ETL_RATES_OFFLINE=1 / ETL_RATES_FIXTURE)")
+    headers = {"If-None-Match": etag} if etag else {}
+    response = requests.get(f"{API_URL}/{path}", params={"app_id": OXR_APP_ID}, headers=headers, timeout=RATES_TIMEOUT)
+    if response.status_code == 304:
+        return None, etag
+    response.raise_for_status()
+    return response.json(), response.headers.get("ETag")
+
+
+def load_fixture(path):
+    # An API response JSON file, or a folder of them, copied into the store
+    path = Path(path)
+    files = sorted(path.glob("*.json")) if path.is_dir() else [path]
+    for file in files:
+        data = read_json(file)
+        write_json(day_file(response_day(data)), data)
+    return len(files)
+
+
+def refresh_latest(ttl_hours=RATES_TTL_HOURS, offline=RATES_OFFLINE):
+    # Returns how the latest rates were obtained: cached, not modified, fetched or offline
+    state = read_json(LATEST_FILE) or {}
+    cached = "day" in state and day_file(state["day"]).exists()
+    if offline:
+        return "offline"
+    if cached and time.time() - state["fetched_at"] < ttl_hours * 3600:
+        return "cached"
+
+    try:
+        data, etag = fetch("latest.json", state.get("etag") if cached else None)
+    except requests.RequestException as err:
+        if not stored_days():
+            raise
+        print(f"⚠️ Exchange rates API unreachable ({err}), using the stored rates")
+        return "offline"
+
+    if data is not None:
+        state["day"] = response_day(data).isoformat()
+        write_json(day_file(state["day"]), data)
+    write_json(LATEST_FILE, {"fetched_at": time.time(), "etag": etag, "day": state["day"]})
+    return "fetched" if data is not None else "not modified"
+
+
+def backfill(start, end, freq=RATES_BACKFILL_FREQ, offline=RATES_OFFLINE):
+    # Historical rates never change: only days missing from the store are fetched
+    missing = [day for day in pd.date_range(start, end, freq=freq) if not day_file(day).exists()]
+    if offline:
+        if missing:
+            print(f"⚠️ Offline: {len(missing)} historical day(s) not in the rate store")
+        return 0
+    for day in missing:
+        data, _ = fetch(f"historical/{day.date().isoformat()}.json")
+        write_json(day_file(day), data)
+    return len(missing)
+
+
+def rates_frame():
+    # Every stored day as rows of (date, currency, rate)
+    frames = []
+    for day in stored_days():
+        rates = read_json(RATES_DIR / f"{day}.json")["rates"]
+        frames.append(pd.DataFrame({"date": day, "currency": list(rates), "rate": list(rates.values())}))
+    if not frames:
+        return pd.DataFrame(columns=["date", "currency", "rate"])
+    return pd.concat(frames, ignore_index=True)
+
+
+if __name__ == "__main__":
+    # python rate_store.py 2016-01-01 2018-12-31 [freq]
+    fetched = backfill(sys.argv[1], sys.argv[2], *sys.argv[3:4])
+    print(f"✅ Backfilled {fetched} day(s) of exchange rates -> {RATES_DIR}")
@@ -0,0 +1,76 @@
+import pandas as pd
+from sqlalchemy import text
+from connections import dwh_engine, connect
+from storage import read_mapped
+from config import REPORT_SOURCE
+
+
+# =========================
+# Report queries
+# =========================
+# Every chart is total_sales of a rollup table summed per label of a small
+# dimension. On a database this runs as one GROUP BY / ORDER BY / LIMIT query
+# and only the aggregated rows are transferred; on a file-based warehouse
+# (data_warehouse layer, read memory-mapped) the same query is evaluated with pandas.
+#   order: "label" (ascending) or "total" (largest first)
+REPORTS = {
+    "sales_by_month": {"rollup": "agg_sales_daily", "key": "order_date_id", "dimension": "dim_date",
+                       "dimension_key": "date_id", "label": "month", "order": "label", "limit": None},
+    "sales_by_year": {"rollup": "agg_sales_daily", "key": "order_date_id", "dimension": "dim_date",
+                      "dimension_key": "date_id", "label": "year", "order": "label", "limit": None},
+    "sales_by_day": {"rollup": "agg_sales_daily", "key": "order_date_id", "dimension": "dim_date",
+                     "dimension_key": "date_id", "label": "day_name", "order": "label", "limit": None},
+    "top_products": {"rollup": "agg_sales_product", "key": "product_id", "dimension": "dim_product",
+                     "dimension_key": "product_id", "label": "product_name", "order": "total", "limit": 10},
+    "sales_by_store_state": {"rollup": "agg_sales_store_region", "key": "store_region_id", "dimension": "dim_region",
+                             "dimension_key": "region_id", "label": "state", "order": "total", "limit": None},
+    "sales_by_staff": {"rollup": "agg_sales_staff", "key": "staff_id", "dimension": "dim_staff",
+                       "dimension_key": "staff_id", "label": "first_name", "order": "total", "limit": None},
+}
+
+
+def report_sql(report, quote):
+    label = quote(report["label"])
+    order = label if report["order"] == "label" else "total_sales DESC"
+    sql = (
+        f"SELECT d.{label} AS {label}, SUM(r.total_sales) AS total_sales "
+        f"FROM {quote(report['rollup'])} r "
+        f"JOIN {quote(report['dimension'])} d ON d.{quote(report['dimension_key'])} = r.{quote(report['key'])} "
+        f"GROUP BY d.{label} ORDER BY {order}"
+    )
+    if report["limit"]:
+        sql += f" LIMIT {int(report['limit'])}"
+    return sql
+
+
+def query_database(report, engine):
+    with connect(engine) as conn:
+        return pd.read_sql(text(report_sql(report, conn.dialect.identifier_preparer.quote)), conn)
+
+
+def query_files(report):
+    # pandas fallback: only the two columns of each table are read, from the
+    # memory-mapped Arrow copy when there is one
+    rollup = read_mapped(report["rollup"], [report["key"], "total_sales"])
+    dimension = read_mapped(report["dimension"], [report["dimension_key"], report["label"]])
+    label = report["label"]
+    result = (
+        rollup
+        .merge(dimension, left_on=report["key"], right_on=report["dimension_key"])
+        .groupby(label, as_index=False, observed=True)
+        .agg(total_sales=("total_sales", "sum"))
+    )
+    if report["order"] == "label":
+        result = result.sort_values(label)
+    else:
+        result = result.sort_values("total_sales", ascending=False)
+    if report["limit"]:
+        result = result.head(report["limit"])
+    return result.reset_index(drop=True)
+
+
+def run_report(name, source=REPORT_SOURCE, engine=None):
+    report = REPORTS[name]
+    if source == "files":
+        return query_files(report)
+    return query_database(report, engine or dwh_engine())
@@ -0,0 +1,66 @@
+import pandas as pd
+
+
+# =========================
+# Sales rollups (summary tables the reports read)
+# =========================
+# Grain of every rollup table. Measures are additive, so rollups can be built
+# chunk by chunk (out-of-core fact_sales) and summed up at the end.
+ROLLUPS = {
+    "agg_sales_daily": ["order_date_id"],
+    "agg_sales_product": ["product_id"],
+    "agg_sales_store_region": ["store_region_id"],
+    "agg_sales_staff": ["staff_id"],
+}
+
+MEASURES = ["total_sales", "quantity", "order_lines"]
+# fact_sales columns the rollups are built from
+ROLLUP_COLUMNS = sorted({key for keys in ROLLUPS.values() for key in keys}) + ["total_sales", "quantity"]
+
+
+def rollup(fact_sales, keys):
+    return fact_sales.groupby(keys, as_index=False, observed=True).agg(
+        total_sales=("total_sales", "sum"),
+        quantity=("quantity", "sum"),
+        order_lines=("total_sales", "size"),
+    )
+
+
+def add_partials(partials, fact_sales, names=ROLLUPS):
+    # partials: {rollup name: [partial rollups]}, filled one fact chunk at a time
+    for name in names:
+        partials.setdefault(name, []).append(rollup(fact_sales, ROLLUPS[name]))
+    return partials
+
+
+def combine_partials(partials):
+    rollups = {}
+    for name, parts in partials.items():
+        keys = ROLLUPS[name]
+        if len(parts) == 1:
+            rollups[name] = parts[0]
+        else:
+            combined = pd.concat(parts, ignore_index=True)
+            rollups[name] = combined.groupby(keys, as_index=False)[MEASURES].sum()
+        rollups[name] = rollups[name].sort_values(keys).reset_index(drop=True)
+    return rollups
+
+
+def build_rollups(fact_chunks, names=ROLLUPS):
+    # fact_chunks: fact_sales as one DataFrame in a list, or any stream of chunks
+    partials = {name: [] for name in names}
+    for fact_sales in fact_chunks:
+        add_partials(partials, fact_sales, names)
+    return combine_partials({name: parts for name, parts in partials.items() if parts})
+
+
+def update_rollup(current, removed_lines, added_lines, name):
+    # Rollup after removed_lines were replaced by added_lines in the fact: the
+    # old lines are subtracted and the new ones added (incremental runs).
+    # Groups left without order lines are dropped
+    keys = ROLLUPS[name]
+    removed = rollup(removed_lines, keys)
+    removed[MEASURES] = -removed[MEASURES]
+    combined = pd.concat([current[keys + MEASURES], removed, rollup(added_lines, keys)], ignore_index=True)
+    combined = combined.groupby(keys, as_index=False)[MEASURES].sum()
+    return combined[combined["order_lines"] > 0].sort_values(keys).reset_index(drop=True)
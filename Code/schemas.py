@@ -0,0 +1,142 @@
+import numpy as np
+import pandas as pd
+
+
+# =========================
+# Schema registry
+# =========================
+# Compact dtypes per dataset, applied whenever a dataset is read, written or
+# handed to the next stage. Keys are dataset names without their stage prefix
+# (orders covers consolidated orders, cleaned_orders and Transformed_orders).
+# Columns that are not listed keep the dtype pandas infers; listed columns a
+# frame does not have are ignored.
+#   int8 / int16 / int32  - downcast ids and counters
+#   Int16 / Int32         - nullable integers for columns with missing values
+#   category              - low-cardinality text (also item_id: line numbers mixed
+#                           with source codes such as 'sz258l')
+STAGE_PREFIXES = ("cleaned_", "Transformed_")
+
+SCHEMAS = {
+    "orders": {
+        "order_id": "int32", "customer_id": "int32", "order_status": "int8", "store_id": "int16", "staff_id": "int16",
+        "delivery_time_days": "Int16", "late_delivery_days": "int16",
+        "late_flag": "category", "status_priority": "category", "source": "category",
+    },
+    "order_items": {
+        "order_id": "int32", "item_id": "category", "product_id": "int32", "quantity": "int16",
+        "Currency": "category", "Target_Currency": "category", "source": "category",
+    },
+    "brands": {"brand_id": "int16", "source": "category"},
+    "categories": {"category_id": "int16", "source": "category"},
+    "customers": {
+        "customer_id": "int32", "city": "category", "state": "category", "zip_code": "Int32",
+        "local_flag": "category", "source": "category",
+    },
+    "products": {
+        "product_id": "int32", "brand_id": "int16", "category_id": "int16", "model_year": "int16",
+        "source": "category",
+    },
+    "staffs": {
+        "staff_id": "int16", "active": "int8", "store_id": "Int16", "manager_id": "Int16",
+        "source": "category",
+    },
+    "stores": {
+        "store_id": "int16", "city": "category", "state": "category", "zip_code": "Int32",
+        "source": "category",
+    },
+    "stocks": {"store_id": "int16", "product_id": "int32", "source": "category"},
+    "exchange_rates": {"source": "category"},
+    "order_status_lookup": {"order_status": "int8", "status_priority": "category"},
+    "dim_date": {"date_id": "int32", "day_name": "category", "month": "category", "year": "int16", "quarter": "int8"},
+    "dim_region": {"region_id": "int32", "city": "category", "state": "category", "zip_code": "Int32"},
+    "dim_product": {"product_id": "int32", "category_name": "category", "brand_name": "category", "model_year": "int16"},
+    "dim_customer": {"customer_id": "int32", "region_id": "Int32", "local_flag": "category"},
+    "dim_store": {"store_id": "int16", "region_id": "Int32"},
+    "dim_staff": {"staff_id": "int16", "active": "int8"},
+    "fact_sales": {
+        "order_id": "int32", "item_id": "category", "product_id": "int32", "customer_id": "int32", "store_id": "int16",
+        "customer_region_id": "Int32", "store_region_id": "Int32", "staff_id": "int16",
+        "order_date_id": "int32", "required_date_id": "Int32", "shipped_date_id": "Int32",
+        "delivery_time_days": "Int16", "late_delivery_days": "int16", "quantity": "int16",
+        "late_flag": "category", "status_priority": "category",
+    },
+    "agg_sales_daily": {"order_date_id": "int32", "quantity": "int32", "order_lines": "int32"},
+    "agg_sales_product": {"product_id": "int32", "quantity": "int32", "order_lines": "int32"},
+    "agg_sales_store_region": {"store_region_id": "int32", "quantity": "int32", "order_lines": "int32"},
+    "agg_sales_staff": {"staff_id": "int16", "quantity": "int32", "order_lines": "int32"},
+}
+
+# Bytes per dataset before / after the schema was applied (last time in this process)
+MEMORY_STATS = {}
+
+
+def schema_for(name):
+    for prefix in STAGE_PREFIXES:
+        if name.startswith(prefix):
+            name = name[len(prefix):]
+            break
+    return SCHEMAS.get(name, {})
+
+
+def cast_column(values, dtype):
+    # Returns values as dtype, or None when they do not fit (out of range,
+    # fractional or non-numeric values) so the column is left as it was
+    if str(values.dtype) == dtype:
+        return values
+    if dtype == "category":
+        return values.astype("category")
+    try:
+        numeric = pd.to_numeric(values)
+        limits = np.iinfo(dtype.lower())
+        if numeric.notna().any() and (numeric.min() < limits.min or numeric.max() > limits.max):
+            return None
+        if dtype.islower() and numeric.isna().any():
+            return None
+        if numeric.dtype.kind == "f" and (numeric.dropna() % 1 != 0).any():
+            return None
+        return numeric.astype(dtype)
+    except (ValueError, TypeError):
+        return None
+
+
+def misfit(values):
+    # Why cast_column left values as they were, for the warning
+    text = values.astype(object)
+    non_numeric = pd.to_numeric(text, errors="coerce").isna() & text.notna()
+    if non_numeric.any():
+        return f"non-numeric values (e.g. {text[non_numeric].iloc[0]!r})"
+    return "values do not fit"
+
+
+def apply_schema(name, df, record=True):
+    schema = schema_for(name)
+    columns = [c for c in schema if c in df.columns]
+    if not columns:
+        return df
+
+    before = df.memory_usage(deep=True).sum() if record else None
+    casts = {}
+    for column in columns:
+        values = df[column]
+        cast = cast_column(values, schema[column])
+        if cast is None:
+            print(f"  ⚠️ {name}.{column}: kept as {values.dtype}, {misfit(values)} for {schema[column]}")
+        elif cast is not values:
+            casts[column] = cast
+    if casts:
+        df = df.assign(**casts)
+    if record:
+        MEMORY_STATS[name] = (before, df.memory_usage(deep=True).sum())
+    return df
+
+
+def print_memory_report():
+    if not MEMORY_STATS:
+        return
+    print("--- Memory per dataset (default dtypes -> schema) ---")
+    total_before = total_after = 0
+    for name, (before, after) in sorted(MEMORY_STATS.items()):
+        total_before += before
+        total_after += after
+        print(f"  {name:<25} {before / 1024:>10.1f} KiB -> {after / 1024:>10.1f} KiB ({1 - after / max(before, 1):.0%} smaller)")
+    print(f"  {'total':<25} {total_before / 1024:>10.1f} KiB -> {total_after / 1024:>10.1f} KiB")
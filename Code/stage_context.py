@@ -0,0 +1,55 @@
+from concurrent.futures import ThreadPoolExecutor
+from storage import read_table, write_table, write_partitioned, write_mapped
+from schemas import apply_schema
+from config import PERSIST_STAGE_OUTPUTS, PERSIST_WORKERS, WAREHOUSE_ARROW
+
+
+# =========================
+# Dataset registry shared by the pipeline stages
+# =========================
+# A stage put()s every dataset it produces and the next stage get()s it straight
+# from memory. Persisting to disk is a side-effect run in background threads.
+# Datasets handed out by get() are shared: stages must not modify them in place.
+class StageContext:
+    def __init__(self, persist=PERSIST_STAGE_OUTPUTS, workers=PERSIST_WORKERS):
+        self.persist = persist
+        self.datasets = {}
+        self.pending = []
+        self.executor = ThreadPoolExecutor(max_workers=workers) if persist else None
+
+    def put(self, layer, name, df, partition_by=None, partitions=None):
+        # Returns df with the dataset's schema (schemas.SCHEMAS) applied, which is
+        # what later stages get. partition_by / partitions: see storage.write_partitioned
+        df = apply_schema(name, df)
+        self.datasets[(layer, name)] = df
+        if self.executor is not None:
+            if partition_by is None:
+                self.pending.append(self.executor.submit(write_table, df, layer, name))
+            else:
+                self.pending.append(self.executor.submit(write_partitioned, df, layer, name, partition_by, partitions))
+            if layer == "data_warehouse" and WAREHOUSE_ARROW:
+                self.pending.append(self.executor.submit(write_mapped, df, name))
+        return df
+
+    def get(self, layer, name):
+        # Datasets no stage produced in this run (e.g. the consolidated layer
+        # written by the streaming extraction) are loaded from disk, uncached
+        if (layer, name) in self.datasets:
+            return self.datasets[(layer, name)]
+        return read_table(layer, name)
+
+    def peek(self, layer, name):
+        # In-memory dataset or None, never touches the disk
+        return self.datasets.get((layer, name))
+
+    def flush(self):
+        # Wait for background writes and surface the first failure
+        pending, self.pending = self.pending, []
+        for future in pending:
+            future.result()
+
+    def close(self):
+        self.flush()
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
@@ -0,0 +1,415 @@
+import shutil
+import pandas as pd
+from schemas import apply_schema
+from config import LAYER_DIRS, STORAGE_FORMATS, PARQUET_COMPRESSION, PARTITION_FLUSH_ROWS
+
+
+EXTENSIONS = {"csv": ".csv", "parquet": ".parquet", "arrow": ".arrow"}
+
+
+# =========================
+# Paths
+# =========================
+def table_format(layer):
+    fmt = STORAGE_FORMATS[layer]
+    if fmt not in EXTENSIONS:
+        raise ValueError(f"Unknown storage format '{fmt}' for layer '{layer}', expected one of {list(EXTENSIONS)}")
+    return fmt
+
+
+def table_path(layer, name):
+    return LAYER_DIRS[layer] / f"{name}{EXTENSIONS[table_format(layer)]}"
+
+
+def table_exists(layer, name):
+    return table_path(layer, name).exists()
+
+
+# =========================
+# Arrow helpers
+# =========================
+def to_arrow(df, schema=None):
+    import pyarrow as pa
+
+    try:
+        return pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+    except (pa.ArrowTypeError, pa.ArrowInvalid):
+        # Object columns mixing numbers and sentinel strings ("Not Available") are stored as text
+        df = df.copy()
+        for col in df.columns[df.dtypes == object]:
+            df[col] = df[col].map(lambda v: v if pd.isna(v) else str(v))
+        return pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+
+
+# =========================
+# Whole-table read / write
+# =========================
+def write_file(df, path, fmt):
+    if fmt == "csv":
+        df.to_csv(path, index=False)
+    elif fmt == "parquet":
+        import pyarrow.parquet as pq
+        pq.write_table(to_arrow(df), path, compression=PARQUET_COMPRESSION)
+    else:
+        import pyarrow.feather as feather
+        feather.write_feather(to_arrow(df), path, compression="uncompressed")
+
+
+def read_file(path, fmt, columns=None):
+    if fmt == "csv":
+        return pd.read_csv(path, usecols=columns)
+    if fmt == "parquet":
+        return pd.read_parquet(path, columns=columns)
+    return pd.read_feather(path, columns=columns)
+
+
+def write_table(df, layer, name):
+    path = table_path(layer, name)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    write_file(apply_schema(name, df, record=False), path, table_format(layer))
+    return path
+
+
+def upsert_table(df, layer, name, key_columns, chunk_size):
+    # Rows of df replace the stored rows with the same key, the others are
+    # added (last write wins, also between duplicates inside df). The stored
+    # table is streamed chunk_size rows at a time into its replacement, only
+    # df and its keys are held in memory
+    df = df.drop_duplicates(key_columns, keep="last")
+    keys = pd.MultiIndex.from_frame(df[key_columns])
+    total_rows = len(df)
+    exists = table_exists(layer, name)
+    with TableWriter(layer, name) as writer:
+        if exists:
+            for chunk in iter_table(layer, name, chunk_size):
+                kept = chunk[~pd.MultiIndex.from_frame(chunk[key_columns]).isin(keys)]
+                if not kept.empty:
+                    writer.write(kept)
+                    total_rows += len(kept)
+        writer.write(df)
+    return writer.path, total_rows
+
+
+def read_table(layer, name, columns=None):
+    # Partitioned tables are directories, see write_partitioned
+    if partition_root(layer, name).is_dir():
+        return apply_schema(name, read_partitioned(layer, name, columns))
+    return apply_schema(name, read_file(table_path(layer, name), table_format(layer), columns))
+
+
+# =========================
+# Memory-mapped warehouse copy (warehouse_arrow layer)
+# =========================
+# Uncompressed Arrow IPC files are used in place: opening one maps it and only
+# the pages of the columns a reader touches are loaded. The OS page cache
+# shares them between every process reading the table.
+def write_mapped(df, name):
+    # Written aside, then renamed over the old file: readers still mapping the
+    # old file keep their pages (rewriting it in place would fault them)
+    path = table_path("warehouse_arrow", name)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_file = path.with_name(path.name + ".tmp")
+    write_file(apply_schema(name, df, record=False), tmp_file, "arrow")
+    tmp_file.replace(path)
+    return path
+
+
+def open_mapped(name, columns=None):
+    # pyarrow Table over the mapped file, no bytes copied; columns projects it
+    import pyarrow as pa
+
+    source = pa.memory_map(str(table_path("warehouse_arrow", name)))
+    table = pa.ipc.open_file(source).read_all()
+    return table.select(columns) if columns else table
+
+
+def read_mapped(name, columns=None):
+    # pandas view of the mapped table: numeric columns without missing values
+    # are not copied (read-only arrays). Falls back to the data_warehouse layer
+    # when the table has no Arrow copy
+    if not table_exists("warehouse_arrow", name):
+        return read_table("data_warehouse", name, columns)
+    return apply_schema(name, open_mapped(name, columns).to_pandas(split_blocks=True), record=False)
+
+
+# =========================
+# Hive-style partitioned tables
+# =========================
+# <layer dir>/<name>/year=2016/month=1/part-0.<ext>; the partition values live
+# in the directory names only.
+def partition_root(layer, name):
+    return LAYER_DIRS[layer] / name
+
+
+def write_partitioned(df, layer, name, partition_values, partitions=None):
+    # partition_values: one column per partition level, aligned with df.
+    # partitions=None rewrites the whole table (built aside, then swapped in);
+    # otherwise only the listed partition tuples are rewritten or removed.
+    fmt = table_format(layer)
+    root = partition_root(layer, name)
+    keys = list(partition_values.columns)
+    build_root = root if partitions is not None else root.with_name(name + ".building")
+    if partitions is None:
+        shutil.rmtree(build_root, ignore_errors=True)
+
+    written = set()
+    for values, part in df.groupby([partition_values[k] for k in keys], sort=True):
+        values = tuple(int(v) for v in values)
+        if partitions is not None and values not in partitions:
+            continue
+        part_dir = build_root.joinpath(*[f"{k}={v}" for k, v in zip(keys, values)])
+        part_dir.mkdir(parents=True, exist_ok=True)
+        part_file = part_dir / f"part-0{EXTENSIONS[fmt]}"
+        tmp_file = part_dir / f".part-0{EXTENSIONS[fmt]}.tmp"
+        write_file(part, tmp_file, fmt)
+        tmp_file.replace(part_file)
+        # Parts a streamed write left next to it (see PartitionedWriter) are now in part-0
+        for stale in part_dir.glob(f"part-*{EXTENSIONS[fmt]}"):
+            if stale != part_file:
+                stale.unlink()
+        written.add(values)
+
+    if partitions is None:
+        swap_in(build_root, root)
+    else:
+        # Partitions that lost all their rows
+        for values in set(partitions) - written:
+            shutil.rmtree(root.joinpath(*[f"{k}={v}" for k, v in zip(keys, values)]), ignore_errors=True)
+    return root
+
+
+def swap_in(build_root, root):
+    # Replaces root with the fully written build_root
+    build_root.mkdir(parents=True, exist_ok=True)
+    old_root = root.with_name(root.name + ".old")
+    if root.exists():
+        root.replace(old_root)
+    build_root.replace(root)
+    shutil.rmtree(old_root, ignore_errors=True)
+
+
+def list_partitions(layer, name):
+    root = partition_root(layer, name)
+    fmt = table_format(layer)
+    for part_file in sorted(root.rglob(f"part-*{EXTENSIONS[fmt]}")):
+        values = dict(level.split("=", 1) for level in part_file.parent.relative_to(root).parts)
+        yield {k: int(v) for k, v in values.items()}, part_file
+
+
+def read_partitioned(layer, name, columns=None, partition_filter=None):
+    # partition_filter(values) -> bool prunes partitions before any file is opened
+    fmt = table_format(layer)
+    frames = [
+        read_file(part_file, fmt, columns)
+        for values, part_file in list_partitions(layer, name)
+        if partition_filter is None or partition_filter(values)
+    ]
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(frames, ignore_index=True)
+
+
+def iter_table(layer, name, chunk_size, columns=None):
+    # Reads a table chunk_size rows at a time (partitioned tables part by part)
+    fmt = table_format(layer)
+    if partition_root(layer, name).is_dir():
+        paths = [part_file for _, part_file in list_partitions(layer, name)]
+    else:
+        paths = [table_path(layer, name)]
+
+    for path in paths:
+        if fmt == "csv":
+            chunks = pd.read_csv(path, usecols=columns, chunksize=chunk_size)
+        elif fmt == "parquet":
+            import pyarrow.parquet as pq
+            batches = pq.ParquetFile(path).iter_batches(batch_size=chunk_size, columns=columns)
+            chunks = (batch.to_pandas() for batch in batches)
+        else:
+            tables = (table.select(columns) if columns else table for table in iter_arrow_batches(path, fmt))
+            chunks = (table.slice(start, chunk_size).to_pandas()
+                      for table in tables for start in range(0, table.num_rows, chunk_size))
+        for chunk in chunks:
+            yield apply_schema(name, chunk, record=False)
+
+
+# =========================
+# Streaming writers (chunked extraction, out-of-core modeling)
+# =========================
+class TableWriter:
+    # Writes chunks to a .part file and only replaces (or appends to) the
+    # table on close, so a failed run never leaves a half written table behind.
+    # path overrides the table's file (see PartitionedWriter)
+    def __init__(self, layer, name, append=False, path=None):
+        self.format = table_format(layer)
+        self.path = table_path(layer, name) if path is None else path
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.part_path = self.path.with_name(self.path.name + ".part")
+        self.append = append and self.path.exists()
+        self.schema = None
+        self.sink = None
+        self.writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def write(self, chunk):
+        # Returns the number of bytes the chunk added to the output
+        if self.format == "csv":
+            if self.sink is None:
+                self.sink = open(self.part_path, "w", encoding="utf-8", newline="")
+            start = self.sink.tell()
+            chunk.to_csv(self.sink, index=False, header=not self.append and start == 0)
+            return self.sink.tell() - start
+
+        import pyarrow as pa
+        if self.writer is None:
+            if self.append:
+                self.schema = read_arrow_schema(self.path, self.format)
+            table = to_arrow(chunk, self.schema)
+            self.schema = table.schema
+            self.sink = pa.OSFile(str(self.part_path), "wb")
+            self.writer = new_arrow_writer(self.sink, self.schema, self.format)
+        else:
+            table = to_arrow(chunk, self.schema)
+        start = self.sink.tell()
+        self.writer.write_table(table)
+        return self.sink.tell() - start
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        if self.sink is not None:
+            self.sink.close()
+        if not self.part_path.exists():
+            return
+
+        if not self.append:
+            self.part_path.replace(self.path)
+        elif self.format == "csv":
+            with open(self.part_path, "rb") as src, open(self.path, "ab") as dst:
+                shutil.copyfileobj(src, dst)
+            self.part_path.unlink()
+        else:
+            merge_arrow_files(self.path, self.part_path, self.format)
+
+    def abort(self):
+        if self.writer is not None:
+            self.writer.close()
+        if self.sink is not None:
+            self.sink.close()
+        self.part_path.unlink(missing_ok=True)
+
+
+def read_arrow_schema(path, fmt):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if fmt == "parquet":
+        return pq.read_schema(path)
+    with pa.memory_map(str(path)) as source:
+        return pa.ipc.open_file(source).schema
+
+
+def new_arrow_writer(sink, schema, fmt):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if fmt == "parquet":
+        return pq.ParquetWriter(sink, schema, compression=PARQUET_COMPRESSION)
+    return pa.ipc.new_file(sink, schema)
+
+
+def iter_arrow_batches(path, fmt):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if fmt == "parquet":
+        parquet_file = pq.ParquetFile(path)
+        for i in range(parquet_file.num_row_groups):
+            yield parquet_file.read_row_group(i)
+    else:
+        with pa.memory_map(str(path)) as source:
+            reader = pa.ipc.open_file(source)
+            for i in range(reader.num_record_batches):
+                yield pa.Table.from_batches([reader.get_batch(i)])
+
+
+def merge_arrow_files(path, part_path, fmt):
+    # Appending to a columnar file means rewriting it, one row group / batch at a time
+    import pyarrow as pa
+
+    merged_path = path.with_name(path.name + ".merged")
+    schema = read_arrow_schema(path, fmt)
+    with pa.OSFile(str(merged_path), "wb") as sink:
+        writer = new_arrow_writer(sink, schema, fmt)
+        for source in (path, part_path):
+            for table in iter_arrow_batches(source, fmt):
+                writer.write_table(table.cast(schema))
+        writer.close()
+    merged_path.replace(path)
+    part_path.unlink()
+
+
+class PartitionedWriter:
+    # Chunked counterpart of write_partitioned(partitions=None), in a build
+    # directory that replaces the table on close. Rows are buffered per
+    # partition and appended to the partition's one part-0 file once
+    # flush_rows are waiting (and on close), so chunks spread over many
+    # partitions do not leave a small file per chunk and partition.
+    def __init__(self, layer, name, flush_rows=PARTITION_FLUSH_ROWS):
+        self.layer = layer
+        self.name = name
+        self.format = table_format(layer)
+        self.root = partition_root(layer, name)
+        self.build_root = self.root.with_name(name + ".building")
+        shutil.rmtree(self.build_root, ignore_errors=True)
+        self.flush_rows = flush_rows
+        self.keys = None
+        self.buffers = {}
+        self.writers = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def write(self, chunk, partition_values):
+        self.keys = list(partition_values.columns)
+        for values, part in chunk.groupby([partition_values[k] for k in self.keys], sort=True):
+            values = tuple(int(v) for v in values)
+            buffer = self.buffers.setdefault(values, [])
+            buffer.append(part)
+            if sum(len(p) for p in buffer) >= self.flush_rows:
+                self.flush(values)
+
+    def flush(self, values):
+        parts = self.buffers.pop(values)
+        writer = self.writers.get(values)
+        if writer is None:
+            part_dir = self.build_root.joinpath(*[f"{k}={v}" for k, v in zip(self.keys, values)])
+            part_dir.mkdir(parents=True, exist_ok=True)
+            writer = TableWriter(self.layer, self.name, path=part_dir / f"part-0{EXTENSIONS[self.format]}")
+            self.writers[values] = writer
+        writer.write(pd.concat(parts, ignore_index=True) if len(parts) > 1 else parts[0])
+
+    def close(self):
+        for values in list(self.buffers):
+            self.flush(values)
+        for writer in self.writers.values():
+            writer.close()
+        swap_in(self.build_root, self.root)
+
+    def abort(self):
+        for writer in self.writers.values():
+            writer.abort()
+        shutil.rmtree(self.build_root, ignore_errors=True)
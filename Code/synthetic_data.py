@@ -0,0 +1,283 @@
+import json
+import math
+import shutil
+import sqlite3
+import argparse
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from config import BASE_DIR
+
+
+# =========================
+# Synthetic source data
+# =========================
+# Schema-compatible copies of the sample sources (Database/ and Datalake Source/)
+# at a scale factor. Customers, orders and order items grow with the scale; the
+# catalogue (products, stores, staff, cities) grows with its square root. Keys
+# are skewed the way shop data is: a few products, stores, cities and customers
+# account for most of the sales. Text values are drawn from the sample tables,
+# counts per order (items, quantities, discounts, days to ship) from their
+# distribution in the sample.
+SAMPLE_DB = BASE_DIR / "Database"
+SAMPLE_LAKE = BASE_DIR / "Datalake Source"
+SAMPLE_RATES = BASE_DIR / "1_Extraction" / "api_data" / "exchange_rates.json"
+CHUNK_ORDERS = 500_000
+EXTRACTION_DATE = 1714563448.0212574
+
+
+def load_samples():
+    samples = {file.stem: pd.read_csv(file) for file in SAMPLE_LAKE.glob("*.csv")}
+    samples.update({file.stem: pd.read_csv(file) for file in SAMPLE_DB.glob("*.csv")})
+    return samples
+
+
+def scaled_counts(samples, scale):
+    catalogue = math.ceil(math.sqrt(scale))
+    return {
+        "customers": max(1, round(len(samples["customers"]) * scale)),
+        "orders": max(1, round(len(samples["orders"]) * scale)),
+        "products": samples["products"]["product_id"].nunique() * catalogue,
+        "stores": len(samples["stores"]) * catalogue,
+        "cities": samples["customers"]["city"].nunique() * catalogue,
+    }
+
+
+def skewed_ids(rng, n, a=1.1):
+    # Cumulative weights of ids 1..n under a truncated Zipf law; the popularity
+    # rank is shuffled so popular ids are spread over the whole range
+    weights = np.cumsum(1 / np.arange(1, n + 1) ** a)
+    return weights / weights[-1], rng.permutation(n) + 1
+
+
+def draw(rng, ids, size):
+    cdf, ranked = ids
+    return ranked[np.minimum(np.searchsorted(cdf, rng.random(size)), len(ranked) - 1)]
+
+
+def draw_like(rng, values, size):
+    # Values with the frequencies they have in the sample column
+    counts = values.value_counts(dropna=False)
+    return rng.choice(counts.index.to_numpy(), size=size, p=(counts / counts.sum()).to_numpy())
+
+
+# =========================
+# Tables
+# =========================
+def generate_cities(samples, n_cities, rng):
+    base = samples["customers"][["city", "state", "zip_code"]].drop_duplicates("city").reset_index(drop=True)
+    copies = -(-n_cities // len(base))
+    cities = pd.concat([
+        base.assign(city=base["city"] + (f" {copy}" if copy else ""), zip_code=base["zip_code"] + copy * 7)
+        for copy in range(copies)
+    ], ignore_index=True)
+    return cities.head(n_cities)
+
+
+def generate_products(samples, n_products, rng):
+    sample = samples["products"].drop_duplicates("product_id")
+    product_id = np.arange(1, n_products + 1)
+    names = sample["product_name"].str.rsplit(" - ", n=1).str[0].to_numpy()
+    model_year = rng.choice(sample["model_year"].to_numpy(), n_products)
+    return pd.DataFrame({
+        "product_id": product_id,
+        "product_name": [f"{names[i % len(names)]} #{i // len(names) + 1} - {year}" for i, year in zip(range(n_products), model_year)],
+        "brand_id": draw_like(rng, sample["brand_id"], n_products),
+        "category_id": draw_like(rng, sample["category_id"], n_products),
+        "model_year": model_year,
+        "list_price": np.round(rng.choice(sample["list_price"].to_numpy(), n_products), 2),
+    })
+
+
+def generate_stores(samples, n_stores, cities, rng):
+    store_cities = cities.iloc[rng.choice(len(cities), n_stores, replace=n_stores > len(cities))].reset_index(drop=True)
+    slug = store_cities["city"].str.lower().str.replace(" ", "", regex=False)
+    return pd.DataFrame({
+        "store_id": np.arange(1, n_stores + 1),
+        "store_name": store_cities["city"] + " Bikes",
+        "phone": [f"({rng.integers(200, 999)}) 555-{rng.integers(1000, 9999)}" for _ in range(n_stores)],
+        "email": slug + "@bikes.shop",
+        "street": rng.choice(samples["stores"]["street"].to_numpy(), n_stores),
+        "city": store_cities["city"],
+        "state": store_cities["state"],
+        "zip_code": store_cities["zip_code"],
+    })
+
+
+def generate_staffs(samples, n_stores, rng):
+    # Staff 1 runs the company (no store); every store has a manager and two staff
+    sample = samples["staffs"]
+    store_id = np.repeat(np.arange(1, n_stores + 1), 3)
+    staff_id = np.arange(2, len(store_id) + 2)
+    manager_id = np.where(np.arange(len(store_id)) % 3 == 0, 1, staff_id - np.arange(len(store_id)) % 3)
+    staffs = pd.DataFrame({
+        "staff_id": np.concatenate([[1], staff_id]),
+        "first_name": rng.choice(sample["first_name"].to_numpy(), len(store_id) + 1),
+        "last_name": rng.choice(sample["last_name"].dropna().to_numpy(), len(store_id) + 1),
+        "phone": [f"({rng.integers(200, 999)}) 555-{rng.integers(1000, 9999)}" for _ in range(len(store_id) + 1)],
+        "active": 1,
+        "store_id": pd.array(np.concatenate([[0], store_id]), dtype="Int32"),
+        "manager_id": pd.array(np.concatenate([[0], manager_id]), dtype="Int32"),
+    })
+    staffs.loc[0, ["store_id", "manager_id"]] = pd.NA
+    staffs.insert(3, "email", staffs["first_name"].str.lower() + "." + staffs["last_name"].str.lower() + "@bikes.shop")
+    return staffs
+
+
+def generate_stocks(samples, n_stores, n_products, rng):
+    store_id = np.repeat(np.arange(1, n_stores + 1), n_products)
+    product_id = np.tile(np.arange(1, n_products + 1), n_stores)
+    stocked = rng.random(len(store_id)) < 0.97
+    return pd.DataFrame({
+        "store_id": store_id[stocked],
+        "product_id": product_id[stocked],
+        "quantity": rng.integers(0, 31, stocked.sum()),
+    })
+
+
+def generate_customers(samples, n_customers, cities, rng, chunk_size=CHUNK_ORDERS):
+    sample = samples["customers"]
+    city_ids = skewed_ids(rng, len(cities), a=0.8)
+    for start in range(0, n_customers, chunk_size):
+        size = min(chunk_size, n_customers - start)
+        first_name = rng.choice(sample["first_name"].to_numpy(), size)
+        last_name = rng.choice(sample["last_name"].to_numpy(), size)
+        city = cities.iloc[draw(rng, city_ids, size) - 1]
+        yield pd.DataFrame({
+            "customer_id": np.arange(start + 1, start + size + 1),
+            "first_name": first_name,
+            "last_name": last_name,
+            "phone": draw_like(rng, sample["phone"], size),
+            "email": pd.Series(first_name).str.lower() + "." + pd.Series(last_name).str.lower()
+                     + "@" + draw_like(rng, sample["email"].str.split("@").str[1], size),
+            "street": rng.choice(sample["street"].to_numpy(), size),
+            "city": city["city"].to_numpy(),
+            "state": city["state"].to_numpy(),
+            "zip_code": city["zip_code"].to_numpy(),
+        })
+
+
+def generate_orders(samples, counts, products, rng, chunk_size=CHUNK_ORDERS):
+    # Yields (orders, order_items) chunks; order dates grow with order_id over
+    # the sample's date range, like the sample
+    orders_sample, items_sample = samples["orders"], samples["order_items"]
+    first_date = pd.Timestamp(orders_sample["order_date"].min())
+    span_days = (pd.Timestamp(orders_sample["order_date"].max()) - first_date).days + 1
+    customer_ids = skewed_ids(rng, counts["customers"], a=0.5)
+    product_ids = skewed_ids(rng, counts["products"])
+    store_ids = skewed_ids(rng, counts["stores"], a=0.8)
+    items_per_order = orders_sample["order_id"].map(items_sample["order_id"].value_counts()).fillna(1).astype(int)
+    prices = products.set_index("product_id")["list_price"]
+    order_date = pd.to_datetime(orders_sample["order_date"])
+    days_required = pd.to_datetime(orders_sample["required_date"]).sub(order_date).dt.days
+    days_shipped = pd.to_datetime(orders_sample["shipped_date"]).sub(order_date).dt.days
+
+    n_orders = counts["orders"]
+    for start in range(0, n_orders, chunk_size):
+        size = min(chunk_size, n_orders - start)
+        order_id = np.arange(start + 1, start + size + 1)
+        dates = first_date + pd.to_timedelta((order_id - 1) * span_days // n_orders, unit="D")
+        store_id = draw(rng, store_ids, size)
+        # Staff of store s are 3s - 1 .. 3s + 1 (see generate_staffs)
+        staff_id = 3 * store_id - 1 + rng.integers(0, 3, size)
+        orders = pd.DataFrame({
+            "order_id": order_id,
+            "customer_id": draw(rng, customer_ids, size),
+            "order_status": draw_like(rng, orders_sample["order_status"], size),
+            "order_date": dates.strftime("%Y-%m-%d"),
+            "required_date": (dates + pd.to_timedelta(draw_like(rng, days_required, size), unit="D")).strftime("%Y-%m-%d"),
+            "shipped_date": (dates + pd.to_timedelta(draw_like(rng, days_shipped, size), unit="D")).strftime("%Y-%m-%d"),
+            "store_id": store_id,
+            "staff_id": staff_id,
+            "Extraction_Date": EXTRACTION_DATE,
+            "source": "SQL-Server",
+        })
+
+        lines = draw_like(rng, items_per_order, size)
+        item_order = np.repeat(order_id, lines)
+        # item_id restarts at 1 within every order
+        item_id = np.arange(len(item_order)) - np.repeat(np.cumsum(lines) - lines, lines) + 1
+        product_id = draw(rng, product_ids, len(item_order))
+        order_items = pd.DataFrame({
+            "order_id": item_order,
+            "item_id": item_id,
+            "product_id": product_id,
+            "quantity": draw_like(rng, items_sample["quantity"], len(item_order)),
+            "list_price": prices.reindex(product_id).to_numpy(),
+            "discount": draw_like(rng, items_sample["discount"], len(item_order)),
+            "Extraction_Date": EXTRACTION_DATE,
+            "source": "SQL-Server",
+        })
+        yield orders, order_items
+
+
+# =========================
+# Dataset
+# =========================
+def append_csv(df, path):
+    df.to_csv(path, mode="a", header=not path.exists(), index=False)
+
+
+def write_dataset(scale, out_dir, seed=0):
+    # Writes <out_dir>/Database/*.csv, <out_dir>/Datalake Source/*.csv and
+    # <out_dir>/source.db (orders / order_items, a SQLite stand-in for MySQL).
+    # An existing dataset with the same scale and seed is reused
+    out_dir = Path(out_dir)
+    manifest_file = out_dir / "synthetic.json"
+    if manifest_file.exists():
+        with open(manifest_file, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest["scale"] == scale and manifest["seed"] == seed:
+            return manifest["counts"]
+
+    rng = np.random.default_rng(seed)
+    samples = load_samples()
+    counts = scaled_counts(samples, scale)
+    db_dir, lake_dir = out_dir / "Database", out_dir / "Datalake Source"
+    for directory in [db_dir, lake_dir]:
+        shutil.rmtree(directory, ignore_errors=True)
+        directory.mkdir(parents=True)
+    (out_dir / "source.db").unlink(missing_ok=True)
+
+    cities = generate_cities(samples, counts["cities"], rng)
+    products = generate_products(samples, counts["products"], rng)
+    staffs = generate_staffs(samples, counts["stores"], rng)
+    tables = {
+        "brands": samples["brands"],
+        "categories": samples["categories"],
+        "products": products,
+        "stores": generate_stores(samples, counts["stores"], cities, rng),
+        "staffs": staffs,
+        "stocks": generate_stocks(samples, counts["stores"], counts["products"], rng),
+    }
+    for name, df in tables.items():
+        df.to_csv(lake_dir / f"{name}.csv", index=False)
+    for chunk in generate_customers(samples, counts["customers"], cities, rng):
+        append_csv(chunk, lake_dir / "customers.csv")
+
+    counts["order_items"] = 0
+    with sqlite3.connect(out_dir / "source.db") as conn:
+        for orders, order_items in generate_orders(samples, counts, products, rng):
+            append_csv(orders, db_dir / "orders.csv")
+            append_csv(order_items, db_dir / "order_items.csv")
+            orders.to_sql("orders", conn, if_exists="append", index=False)
+            order_items.to_sql("order_items", conn, if_exists="append", index=False)
+            counts["order_items"] += len(order_items)
+        conn.execute("CREATE INDEX ix_orders_order_id ON orders (order_id)")
+        conn.execute("CREATE INDEX ix_order_items_order_id ON order_items (order_id)")
+    if SAMPLE_RATES.exists():
+        shutil.copyfile(SAMPLE_RATES, out_dir / "exchange_rates.json")
+
+    with open(manifest_file, "w", encoding="utf-8") as f:
+        json.dump({"scale": scale, "seed": seed, "counts": counts}, f, indent=2)
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate schema-compatible source data at a scale factor")
+    parser.add_argument("--scale", type=float, default=1, help="1 = the size of the sample data")
+    parser.add_argument("--out", type=Path, required=True)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    counts = write_dataset(args.scale, args.out, args.seed)
+    print(f"✅ Synthetic data ({args.scale}x) -> {args.out}: " + ", ".join(f"{n:,} {name}" for name, n in counts.items()))
@@ -0,0 +1,12 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# The pipeline modules are flat scripts in Code/, imported by name
+CODE_DIR = Path(__file__).resolve().parents[1] / "Code"
+sys.path.insert(0, str(CODE_DIR))
+
+# config resolves every path from ETL_BASE_DIR at import: keep test runs out of the repo folders
+os.environ["ETL_BASE_DIR"] = tempfile.mkdtemp(prefix="etl_tests_")
+os.environ.setdefault("MPLBACKEND", "Agg")
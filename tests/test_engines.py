@@ -0,0 +1,129 @@
+import json
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("duckdb")
+
+import synthetic_data
+import duckdb_engine
+import Modeling
+from cleaning_transformations import clean_table, TRANSFORMS
+from pipeline_dag import PANDAS_BUILDERS
+from quality_rules import apply_rules, compile_masks
+from rate_store import response_day
+from schemas import apply_schema
+from config import CLEANING_RULES
+
+REPO_DIR = Path(__file__).resolve().parents[1]
+TODAY = pd.Timestamp("2026-01-01")
+
+
+# =========================
+# Small synthetic dataset, as the extraction consolidates it
+# =========================
+@pytest.fixture(scope="module")
+def consolidated(tmp_path_factory):
+    out_dir = tmp_path_factory.mktemp("synthetic")
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(synthetic_data, "SAMPLE_DB", REPO_DIR / "Database")
+        patch.setattr(synthetic_data, "SAMPLE_LAKE", REPO_DIR / "Datalake Source")
+        patch.setattr(synthetic_data, "SAMPLE_RATES", REPO_DIR / "1_Extraction" / "api_data" / "exchange_rates.json")
+        synthetic_data.write_dataset(0.5, out_dir, seed=7)
+
+    tables = {file.stem: pd.read_csv(file) for folder in ["Database", "Datalake Source"]
+              for file in (out_dir / folder).glob("*.csv")}
+    with open(out_dir / "exchange_rates.json", "r", encoding="utf-8") as f:
+        rates = json.load(f)
+    tables["exchange_rates"] = pd.DataFrame({"date": response_day(rates).isoformat(), "currency": list(rates["rates"]),
+                                             "rate": list(rates["rates"].values())})
+    for name, df in tables.items():
+        df["extracted_at"] = "2026-01-01T00:00:00"
+        df["source"] = "test"
+
+    # Dirty rows for the rules: a duplicate order, a missing key, a negative price
+    orders = tables["orders"]
+    tables["orders"] = pd.concat([orders, orders.head(3), orders.head(1).assign(order_id=np.nan)], ignore_index=True)
+    items = tables["order_items"]
+    tables["order_items"] = pd.concat([items, items.head(2).assign(list_price=-1.0)], ignore_index=True)
+    return {name: apply_schema(name, df, record=False) for name, df in tables.items()}
+
+
+def cleaned(consolidated, engine):
+    return {table: apply_schema(f"cleaned_{table}", clean_table(table, consolidated[table], rules, engine), record=False)
+            for table, rules in CLEANING_RULES.items() if table in consolidated}
+
+
+@pytest.fixture(scope="module")
+def staged(consolidated):
+    # Cleaned and transformed inputs of the builders (pandas engine)
+    tables = cleaned(consolidated, "pandas")
+    for name, (func, inputs) in TRANSFORMS.items():
+        tables[name] = apply_schema(name, func(*[tables[t] for t in inputs]), record=False)
+    return tables
+
+
+# =========================
+# Parity: the DuckDB engine returns the pandas frames
+# =========================
+@pytest.mark.parametrize("table", list(CLEANING_RULES))
+def test_rules_match(consolidated, table):
+    df = consolidated[table]
+    expected = apply_rules(df, CLEANING_RULES[table], TODAY)
+    actual = apply_rules(df, CLEANING_RULES[table], TODAY, compile=duckdb_engine.compile_masks)
+    pd.testing.assert_frame_equal(actual[0], expected[0])
+    assert actual[1] == expected[1]
+    pd.testing.assert_frame_equal(actual[2], expected[2])
+
+
+def test_cleaning_rejects_dirty_rows(consolidated):
+    _, reject_counts, _ = apply_rules(consolidated["orders"], CLEANING_RULES["orders"], TODAY,
+                                      compile=duckdb_engine.compile_masks)
+    assert sum(reject_counts.values()) >= 4
+
+
+def dimensions(staged, build):
+    dim_region = apply_schema("dim_region", build["build_dim_region"](staged["Transformed_customers"], staged["stores"]), record=False)
+    dims = {
+        "dim_region": dim_region,
+        "dim_product": build["build_dim_product"](staged["products"], staged["categories"], staged["brands"]),
+        "dim_customer": build["build_dim_customer"](staged["Transformed_customers"], dim_region),
+        "dim_store": build["build_dim_store"](staged["stores"], dim_region),
+        "dim_staff": build["build_dim_staff"](staged["staffs"]),
+    }
+    return {name: apply_schema(name, dim, record=False) for name, dim in dims.items()}
+
+
+@pytest.fixture(scope="module")
+def pandas_dims(staged):
+    return dimensions(staged, PANDAS_BUILDERS)
+
+
+def test_dimensions_match(staged, pandas_dims):
+    duckdb_dims = dimensions(staged, duckdb_engine.BUILDERS)
+    for name, expected in pandas_dims.items():
+        pd.testing.assert_frame_equal(duckdb_dims[name], expected, check_exact=True, obj=name)
+
+
+def fact_inputs(staged, dims):
+    orders = staged["Transformed_orders"]
+    dim_date = apply_schema("dim_date", Modeling.build_dim_date({"orders": {"df": orders, "cols": Modeling.DATE_COLUMNS}}), record=False)
+    return (orders, staged["Transformed_order_items"], dim_date, dims["dim_product"], dims["dim_customer"],
+            dims["dim_store"], dims["dim_staff"])
+
+
+def test_fact_sales_matches(staged, pandas_dims):
+    inputs = fact_inputs(staged, pandas_dims)
+    expected = Modeling.build_fact_sales(*inputs)
+    assert len(expected) > 0
+    pd.testing.assert_frame_equal(duckdb_engine.build_fact_sales(*inputs), expected, check_exact=True)
+
+
+def test_fact_sales_matches_with_misses(staged, pandas_dims):
+    # Lines whose date, product or customer is missing from the dimensions
+    orders, items, dim_date, dim_product, dim_customer, dim_store, dim_staff = fact_inputs(staged, pandas_dims)
+    inputs = (orders, items, dim_date.iloc[30:], dim_product.iloc[5:], dim_customer.iloc[3:], dim_store, dim_staff)
+    expected = Modeling.build_fact_sales(*inputs)
+    assert len(expected) < len(items)
+    pd.testing.assert_frame_equal(duckdb_engine.build_fact_sales(*inputs), expected, check_exact=True)
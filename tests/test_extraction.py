@@ -0,0 +1,107 @@
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import StaticPool
+import config
+import Extraction
+import storage
+from storage import read_table
+
+
+# =========================
+# Small MySQL stand-in: orders with a last-modified column
+# =========================
+@pytest.fixture
+def source(tmp_path, monkeypatch):
+    monkeypatch.setitem(config.LAYER_DIRS, "consolidated", tmp_path / "consolidated")
+    monkeypatch.setattr(Extraction, "WATERMARKS_FILE", tmp_path / "watermarks.json")
+    monkeypatch.setattr(Extraction, "CHANGED_ORDERS_FILE", tmp_path / "changed_orders.csv")
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    monkeypatch.setattr(Extraction, "mysql_engine", lambda: engine)
+    pd.DataFrame({
+        "order_id": [1, 2, 3],
+        "customer_id": [10, 11, 12],
+        "order_date": ["2016-01-01", "2016-01-01", "2016-01-02"],
+        "shipped_date": ["2016-01-03", "2016-01-04", "2016-01-05"],
+        "updated_at": ["2016-01-01 09:00:00", "2016-01-01 10:00:00", "2016-01-02 12:00:00"],
+    }).to_sql("orders", engine, index=False)
+    yield engine
+    engine.dispose()
+
+
+def consolidated_orders():
+    return read_table("consolidated", "orders").set_index("order_id")
+
+
+def test_incremental_upserts_changed_rows(source):
+    assert Extraction.extract_mysql_table("orders", incremental=True)["mode"] == "full"
+    # Modeling ran on the full pull
+    Extraction.clear_changed_orders()
+    with source.begin() as conn:
+        conn.execute(text("UPDATE orders SET shipped_date = '2016-01-09', updated_at = '2016-01-03 08:00:00' WHERE order_id = 1"))
+        conn.execute(text("INSERT INTO orders VALUES (99999, 13, '2016-01-03', NULL, '2016-01-03 09:00:00')"))
+
+    stats = Extraction.extract_mysql_table("orders", incremental=True)
+
+    assert stats["mode"] == "incremental"
+    orders = consolidated_orders()
+    assert orders.index.is_unique
+    assert sorted(orders.index) == [1, 2, 3, 99999]
+    assert orders.loc[1, "shipped_date"] == "2016-01-09"
+    # Order 3 is re-read by the overlap window
+    assert sorted(Extraction.changed_orders()) == [1, 3, 99999]
+
+
+@pytest.mark.parametrize("fmt", ["csv", "parquet"])
+def test_upsert_streams_the_stored_table(source, monkeypatch, fmt):
+    monkeypatch.setitem(config.STORAGE_FORMATS, "consolidated", fmt)
+    Extraction.extract_mysql_table("orders", incremental=True)
+    with source.begin() as conn:
+        conn.execute(text("UPDATE orders SET shipped_date = NULL, updated_at = '2016-01-03 08:00:00' WHERE order_id = 2"))
+
+    # Only the delta is read whole, the stored table is streamed
+    def read_delta_only(layer, name, columns=None):
+        assert name == "orders_delta"
+        return read_table(layer, name, columns)
+    monkeypatch.setattr(Extraction, "read_table", read_delta_only)
+    monkeypatch.setattr(storage, "read_table", read_delta_only)
+
+    Extraction.extract_mysql_table("orders", chunk_size=1, incremental=True)
+
+    orders = consolidated_orders()
+    assert sorted(orders.index) == [1, 2, 3]
+    assert pd.isna(orders.loc[2, "shipped_date"])
+    assert orders.loc[1, "shipped_date"] == "2016-01-03"
+    assert not list(config.LAYER_DIRS["consolidated"].glob("orders_delta*"))
+
+
+def test_full_pull_makes_changed_orders_unknown(source):
+    Extraction.clear_changed_orders()
+
+    Extraction.extract_mysql_table("orders", incremental=False)
+
+    assert Extraction.changed_orders() is None
+
+
+def test_incremental_picks_up_late_rows_in_the_overlap(source):
+    Extraction.extract_mysql_table("orders", incremental=True)
+    # Committed after the last pull, stamped just before its watermark
+    with source.begin() as conn:
+        conn.execute(text("INSERT INTO orders VALUES (4, 14, '2016-01-02', NULL, '2016-01-02 11:30:00')"))
+
+    Extraction.extract_mysql_table("orders", incremental=True)
+
+    orders = consolidated_orders()
+    assert orders.index.is_unique
+    assert 4 in orders.index
+    assert len(orders) == 4
+
+
+def test_missing_watermark_column_extracts_in_full(source, monkeypatch):
+    monkeypatch.setitem(Extraction.MYSQL_WATERMARK_COLUMNS, "orders", "modified_at")
+    Extraction.extract_mysql_table("orders", incremental=True)
+
+    stats = Extraction.extract_mysql_table("orders", incremental=True)
+
+    assert stats["mode"] == "full"
+    assert len(consolidated_orders()) == 3
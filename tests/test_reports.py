@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.pool import StaticPool
+import config
+from reports import REPORTS, query_database, query_files
+from rollups import build_rollups
+from storage import write_table, write_mapped
+
+
+# =========================
+# Small warehouse: dimensions + rollups built from a random fact_sales
+# =========================
+def warehouse(seed=0, lines=500):
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range("2016-01-01", "2017-12-31", freq="D")
+    dim_date = pd.DataFrame({
+        "date_id": dates.year * 10000 + dates.month * 100 + dates.day,
+        "month": dates.month, "year": dates.year, "day_name": dates.day_name(),
+    })
+    dim_product = pd.DataFrame({"product_id": np.arange(1, 31), "product_name": [f"Product {i}" for i in range(1, 31)]})
+    dim_region = pd.DataFrame({"region_id": np.arange(1, 6), "state": ["CA", "NY", "TX", "FL", "WA"]})
+    dim_staff = pd.DataFrame({"staff_id": np.arange(1, 9), "first_name": [f"Staff {i}" for i in range(1, 9)]})
+    fact_sales = pd.DataFrame({
+        "order_date_id": rng.choice(dim_date["date_id"], lines),
+        "product_id": rng.integers(1, 31, lines),
+        "store_region_id": rng.integers(1, 6, lines),
+        "staff_id": rng.integers(1, 9, lines),
+        "quantity": rng.integers(1, 4, lines),
+        # Cents plus a unique fraction: no two groups share a total
+        "total_sales": rng.integers(100, 500_000, lines) / 100 + np.arange(lines) * 1e-6,
+    })
+    tables = {"dim_date": dim_date, "dim_product": dim_product, "dim_region": dim_region, "dim_staff": dim_staff}
+    tables.update(build_rollups([fact_sales]))
+    return tables
+
+
+@pytest.fixture
+def loaded(tmp_path, monkeypatch, request):
+    # The same tables in an in-memory SQLite warehouse and in the data_warehouse layer
+    monkeypatch.setitem(config.LAYER_DIRS, "data_warehouse", tmp_path / "data_warehouse")
+    monkeypatch.setitem(config.LAYER_DIRS, "warehouse_arrow", tmp_path / "warehouse_arrow")
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    for name, df in warehouse().items():
+        df.to_sql(name, engine, index=False)
+        write_table(df, "data_warehouse", name)
+        if request.param == "mapped":
+            write_mapped(df, name)
+    yield engine
+    engine.dispose()
+
+
+def as_text_labels(df):
+    return df.astype({df.columns[0]: str}).reset_index(drop=True)
+
+
+@pytest.mark.parametrize("loaded", ["layer", "mapped"], indirect=True)
+@pytest.mark.parametrize("name", list(REPORTS))
+def test_pushdown_matches_pandas(loaded, name):
+    report = REPORTS[name]
+    pushed_down = query_database(report, loaded)
+    fallback = query_files(report)
+    assert list(pushed_down.columns) == [report["label"], "total_sales"]
+    if report["limit"]:
+        assert len(pushed_down) == report["limit"]
+    pd.testing.assert_frame_equal(as_text_labels(pushed_down), as_text_labels(fallback), check_dtype=False)
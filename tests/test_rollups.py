@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+import pytest
+from rollups import ROLLUPS, add_partials, build_rollups, combine_partials, update_rollup
+
+
+def fact(seed=0, lines=300):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "sales_key": np.arange(1, lines + 1),
+        "order_date_id": rng.choice([20160101, 20160102, 20160103, 20160201], lines),
+        "product_id": rng.integers(1, 20, lines),
+        "store_region_id": rng.integers(1, 4, lines),
+        "staff_id": rng.integers(1, 6, lines),
+        "quantity": rng.integers(1, 4, lines),
+        "total_sales": rng.integers(100, 50_000, lines) / 100,
+    })
+
+
+def assert_rollups_equal(expected, actual):
+    assert expected.keys() == actual.keys()
+    for name in expected:
+        pd.testing.assert_frame_equal(expected[name], actual[name], check_dtype=False)
+
+
+def test_partials_match_one_pass():
+    fact_sales = fact()
+    partials = {}
+    for start in range(0, len(fact_sales), 70):
+        add_partials(partials, fact_sales.iloc[start:start + 70])
+    assert_rollups_equal(build_rollups([fact_sales]), combine_partials(partials))
+
+
+@pytest.mark.parametrize("name", list(ROLLUPS))
+def test_update_matches_rebuild(name):
+    before = fact()
+    # Lines 1-40 change (quantity / date / product), 41-60 and every line of
+    # 2016-02-01 are deleted, 20 lines are new
+    changed = before.iloc[:40].assign(quantity=lambda df: df["quantity"] + 1, product_id=7, order_date_id=20160301)
+    new = fact(seed=1, lines=20).assign(sales_key=lambda df: df["sales_key"] + 1000, order_date_id=20160102)
+    added = pd.concat([changed, new])
+    removed = before[(before["sales_key"] <= 60) | (before["order_date_id"] == 20160201)]
+    after = pd.concat([before[~before["sales_key"].isin(removed["sales_key"])], added])
+
+    updated = update_rollup(build_rollups([before])[name], removed, added, name)
+
+    expected = build_rollups([after], [name])[name]
+    pd.testing.assert_frame_equal(expected, updated, check_dtype=False)
+    assert (updated["order_lines"] > 0).all()
@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+import pytest
+import config
+import storage
+from storage import PartitionedWriter, list_partitions, partition_root, read_partitioned, write_partitioned
+
+
+@pytest.fixture(params=["csv", "parquet", "arrow"])
+def layer(request, tmp_path, monkeypatch):
+    monkeypatch.setitem(config.LAYER_DIRS, "data_warehouse", tmp_path / "data_warehouse")
+    monkeypatch.setitem(config.STORAGE_FORMATS, "data_warehouse", request.param)
+    return "data_warehouse"
+
+
+def lines(rows=1000, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "sales_key": np.arange(1, rows + 1),
+        "year": rng.choice([2016, 2017], rows),
+        "month": rng.integers(1, 13, rows),
+        "total_sales": rng.integers(100, 50_000, rows) / 100,
+    })
+
+
+@pytest.mark.parametrize("flush_rows", [10, 100_000])
+def test_partitioned_writer_writes_one_file_per_partition(layer, flush_rows):
+    df = lines()
+    with PartitionedWriter(layer, "fact_sales", flush_rows=flush_rows) as writer:
+        for start in range(0, len(df), 50):
+            chunk = df.iloc[start:start + 50]
+            writer.write(chunk.drop(columns=["year", "month"]), chunk[["year", "month"]])
+
+    partitions = list(list_partitions(layer, "fact_sales"))
+    assert len(partitions) == len(df.groupby(["year", "month"]))
+    assert all(part_file.name.startswith("part-0.") for _, part_file in partitions)
+    stored = read_partitioned(layer, "fact_sales").sort_values("sales_key").reset_index(drop=True)
+    pd.testing.assert_frame_equal(df.drop(columns=["year", "month"]), stored, check_dtype=False)
+
+
+def test_partition_filter_opens_only_matching_partitions(layer, monkeypatch):
+    df = lines()
+    write_partitioned(df.drop(columns=["year", "month"]), layer, "fact_sales", df[["year", "month"]])
+    opened = []
+    read_file = storage.read_file
+    monkeypatch.setattr(storage, "read_file", lambda path, *args: opened.append(path) or read_file(path, *args))
+
+    stored = read_partitioned(layer, "fact_sales", partition_filter=lambda values: values == {"year": 2017, "month": 3})
+
+    root = partition_root(layer, "fact_sales")
+    assert [path.parent.relative_to(root).as_posix() for path in opened] == ["year=2017/month=3"]
+    expected = df[(df["year"] == 2017) & (df["month"] == 3)].drop(columns=["year", "month"])
+    pd.testing.assert_frame_equal(expected.reset_index(drop=True), stored.sort_values("sales_key", ignore_index=True),
+                                  check_dtype=False)